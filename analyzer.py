@@ -1,11 +1,19 @@
 from datetime import timedelta
 
-import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
 from utils import pearson_correlation, assess_seismic_hazard, depth_magnitude_correlation
-from cartopy_maps import visualize_on_map
+from cancellation import check_cancelled
+from declustering import decluster, fixed_window
+from event_table import EventTable, as_frame
+from rendering import figure_to_png, render_charts
+from seismicity_rates import count_between, rate_engine
 
 
-def analyze_earthquake_data(df):
+def analyze_earthquake_data(df, cancel_event=None, progress=None):
+    # progress(stage) се извиква преди декластеризацията, за да се измерва отделно
+    report = progress or (lambda stage: None)
+    df = as_frame(df)
     result = f"Анализирани {len(df)} земетресения.\n" \
              f"Среден магнитуд: {df['magnitude'].mean():.2f}\n" \
              f"Средна дълбочина: {df['depth'].mean():.2f} км"
@@ -16,6 +24,7 @@ def analyze_earthquake_data(df):
                                                 axis=1).str.cat(sep='\n')
 
     country_counts = df['country'].value_counts()
+    country_counts = country_counts[country_counts > 0]  # категориите без земетресения не се броят
     if len(country_counts) > 0:
         most_affected_region = country_counts.index[0]
         affected_region_count = country_counts.iloc[0]
@@ -23,26 +32,32 @@ def analyze_earthquake_data(df):
         most_affected_region = "Няма данни"
         affected_region_count = 0
 
+    check_cancelled(cancel_event)
     depth_magnitude_correlation = pearson_correlation(df['depth'], df['magnitude'])
 
     seismic_hazard_assessment = assess_seismic_hazard(df, most_affected_region)
 
-    aftershocks_analysis = analyze_aftershocks(df)
+    check_cancelled(cancel_event)
+    report('declustering')
+    aftershocks_analysis = analyze_aftershocks(df, cancel_event=cancel_event)
 
     return (result, top_earthquakes_str, most_affected_region, affected_region_count,
             depth_magnitude_correlation, seismic_hazard_assessment, aftershocks_analysis)
 
 
 def analyze_seismic_activity_change(df, start_date, end_date, min_magnitude):
+    df = as_frame(df, ['time', 'magnitude'])
     total_period = (end_date - start_date).days
     mid_date = start_date + timedelta(days=total_period // 2)
 
-    first_half = df[(df['time'] >= start_date) & (df['time'] < mid_date) & (df['magnitude'] >= min_magnitude)]
-    second_half = df[(df['time'] >= mid_date) & (df['time'] <= end_date) & (df['magnitude'] >= min_magnitude)]
+    # Едно сортиране на времената и брой събития във всяка половина чрез двоично търсене
+    times = df['time'].to_numpy(dtype='datetime64[ns]')[df['magnitude'].to_numpy(dtype=float) >= min_magnitude]
+    first_half_count, second_half_count = count_between(times, [start_date, mid_date, end_date])
 
-    first_half_count = len(first_half)
-    second_half_count = len(second_half)
+    return format_activity_change(int(first_half_count), int(second_half_count), total_period)
 
+
+def format_activity_change(first_half_count, second_half_count, total_period):
     percent_change = ((second_half_count - first_half_count) / first_half_count) * 100 if first_half_count > 0 else 0
 
     years = total_period / 365
@@ -61,81 +76,143 @@ def analyze_seismic_activity_change(df, start_date, end_date, min_magnitude):
     return analysis_result
 
 
-def analyze_aftershocks(df):
+def analyze_aftershocks(df, window=fixed_window, cancel_event=None):
+    df = as_frame(df, ['time', 'latitude', 'longitude', 'magnitude', 'place'])
     sorted_df = df.sort_values('magnitude', ascending=False)
 
-    main_quakes = []
-    aftershocks = []
-
-    for _, quake in sorted_df.iterrows():
-        is_aftershock = False
-        for main_quake in main_quakes:
-            # Проверка дали земетресението е в рамките на 7 дни и 100 км от главното земетресение
-            time_diff = abs((quake['time'] - main_quake['time']).total_seconds())
-            distance = ((quake['latitude'] - main_quake['latitude']) ** 2 +
-                        (quake['longitude'] - main_quake['longitude']) ** 2) ** 0.5
-            if time_diff <= 7 * 24 * 60 * 60 and distance <= 100 / 111:  # 111 км е приблизително 1 градус
-                aftershocks.append((main_quake, quake))
-                is_aftershock = True
-                break
-        if not is_aftershock:
-            main_quakes.append(quake)
-
-    # Анализ на афтършоковете
-    aftershocks_count = {}
-    for main_quake, _ in aftershocks:
-        if main_quake['time'] not in aftershocks_count:
-            aftershocks_count[main_quake['time']] = 1
-        else:
-            aftershocks_count[main_quake['time']] += 1
+    # Проверка дали земетресението е в рамките на прозореца (по подразбиране 7 дни и 100 км) от главното земетресение
+    times = sorted_df['time'].to_numpy(dtype='datetime64[ns]')
+    main_of = decluster(times,
+                        sorted_df['latitude'].to_numpy(dtype=float),
+                        sorted_df['longitude'].to_numpy(dtype=float),
+                        sorted_df['magnitude'].to_numpy(dtype=float),
+                        window=window, cancel_event=cancel_event)
+
+    positions = np.arange(len(sorted_df))
+    main_positions = positions[main_of == positions]
+    aftershock_positions = positions[main_of != positions]
+
+    # Анализ на афтършоковете (групиране по времето на главното земетресение)
+    aftershock_main_times = times[main_of[aftershock_positions]]
+    main_times, first_seen, counts = np.unique(aftershock_main_times, return_index=True, return_counts=True)
 
     # Сортиране на земетресенията по брой афтършокове
-    sorted_aftershocks = sorted(aftershocks_count.items(), key=lambda x: x[1], reverse=True)
+    order = np.lexsort((first_seen, -counts))
+    sorted_aftershocks = [(main_times[j], counts[j]) for j in order]
 
-    result = f"За изследвания период има {len(main_quakes)} главни земетресения и {len(aftershocks)} вторични трусове.\n\n"
+    # За всяко време - първото главно земетресение с това време
+    unique_main_times, first_main = np.unique(times[main_positions], return_index=True)
+    places = sorted_df['place'].to_numpy()
+
+    def main_quake_place(time):
+        position = main_positions[first_main[np.searchsorted(unique_main_times, time)]]
+        return places[position]
+
+    result = f"За изследвания период има {len(main_positions)} главни земетресения и {len(aftershock_positions)} вторични трусове.\n\n"
 
     result += "Най-голям брой афтършокове се наблюдават след следните земетресения:\n"
     for i, (time, count) in enumerate(sorted_aftershocks[:3], 1):
-        main_quake = next(quake for quake in main_quakes if quake['time'] == time)
-        result += f"{i}. {main_quake['place']}, {time.strftime('%Y-%m-%d')}, {count} афтършока\n"
+        result += f"{i}. {main_quake_place(time)}, {pd.Timestamp(time).strftime('%Y-%m-%d')}, {count} афтършока\n"
 
     result += "\nНай-малък брой афтършокове се наблюдават след следните земетресения:\n"
     for i, (time, count) in enumerate(sorted_aftershocks[-3:], 1):
-        main_quake = next(quake for quake in main_quakes if quake['time'] == time)
-        result += f"{i}. {main_quake['place']}, {time.strftime('%Y-%m-%d')}, {count} афтършока\n"
+        result += f"{i}. {main_quake_place(time)}, {pd.Timestamp(time).strftime('%Y-%m-%d')}, {count} афтършока\n"
 
     return result
 
 
-def visualize_earthquake_data(df, start_date, end_date):
-    plt.figure(figsize=(10, 6))
-    scatter = plt.scatter(df['time'], df['magnitude'], c=df['depth'], cmap='viridis', alpha=0.4)
-    plt.colorbar(scatter, label='Дълбочина (км)')
-    plt.title('Земетресения във времето')
-    plt.xlabel('Времева ос')
-    plt.ylabel('Магнитуд')
-    plt.savefig('earthquakes_over_time.png')
-    plt.close()
-
-    plt.figure(figsize=(10, 6))
-    df['magnitude'].hist(bins=20, edgecolor='black')
-    plt.title('Разпределение на магнитудите')
-    plt.xlabel('Магнитуд')
-    plt.ylabel('Брой земетресения')
-    plt.savefig('magnitude_distribution.png')
-    plt.close()
-
-
-def analyze_and_visualize(df, start_date, end_date, min_magnitude):
-    analysis_results = analyze_earthquake_data(df)
-    visualize_earthquake_data(df, start_date, end_date)
+def plot_earthquakes_over_time(df):
+    from matplotlib.figure import Figure
+
+    df = as_frame(df, ['time', 'magnitude', 'depth'])
+    fig = Figure(figsize=(10, 6))
+    ax = fig.add_subplot()
+    scatter = ax.scatter(df['time'], df['magnitude'], c=df['depth'], cmap='viridis', alpha=0.4)
+    fig.colorbar(scatter, ax=ax, label='Дълбочина (км)')
+    ax.set_title('Земетресения във времето')
+    ax.set_xlabel('Времева ос')
+    ax.set_ylabel('Магнитуд')
+    return figure_to_png(fig)
+
+
+def plot_magnitude_distribution(df):
+    from matplotlib.figure import Figure
+
+    df = as_frame(df, ['magnitude'])
+    fig = Figure(figsize=(10, 6))
+    ax = fig.add_subplot()
+    ax.hist(df['magnitude'].dropna(), bins=20, edgecolor='black')
+    ax.grid(True)
+    ax.set_title('Разпределение на магнитудите')
+    ax.set_xlabel('Магнитуд')
+    ax.set_ylabel('Брой земетресения')
+    return figure_to_png(fig)
+
+
+def plot_seismicity_rates(df, start_date, end_date, min_magnitude):
+    from matplotlib.figure import Figure
+
+    rates = rate_engine(df, start_date, end_date, min_magnitude=min_magnitude)
+    times = rates['time']
+    anomaly = rates['anomaly'][0]
+
+    fig = Figure(figsize=(10, 6))
+    ax_rate, ax_b = fig.subplots(2, 1, sharex=True)
+    ax_rate.plot(times, rates['rate'][0], color='tab:blue')
+    ax_rate.axhline(rates['background_rate'][0], color='gray', linestyle='--', linewidth=0.8)
+    ax_rate.scatter(times[anomaly], rates['rate'][0][anomaly], color='red', zorder=3, label='Значима промяна')
+    ax_rate.set_title(f"Сеизмичност в плъзгащ се прозорец от {rates['window_days']:.0f} дни")
+    ax_rate.set_ylabel('Земетресения на ден')
+    ax_rate.grid(True)
+    if anomaly.any():
+        ax_rate.legend(loc='upper left')
+
+    ax_b.plot(times, rates['b_value'][0], color='tab:green')
+    ax_b.fill_between(times, rates['b_value'][0] - rates['b_error'][0], rates['b_value'][0] + rates['b_error'][0],
+                      color='tab:green', alpha=0.2)
+    ax_b.set_ylabel('b-стойност')
+    ax_b.set_xlabel('Времева ос')
+    ax_b.grid(True)
+
+    if (rates['moment'][0] > 0).any():
+        ax_moment = ax_b.twinx()
+        ax_moment.semilogy(times, rates['moment'][0], color='tab:orange', alpha=0.6)
+        ax_moment.set_ylabel('Сеизмичен момент (N·m)')
+    return figure_to_png(fig)
+
+
+def visualize_earthquake_data(df, start_date, end_date, min_magnitude, parallel=True, cancel_event=None,
+                              timings=None):
+    # Четирите диаграми се изчертават паралелно в отделни процеси и се връщат като PNG в паметта.
+    # Cartopy и matplotlib се зареждат едва тук, за да не забавят стартирането и анализите без диаграми
+    from cartopy_maps import create_world_map
+
+    # Компактната таблица се предава на процесите без преобразуване (по-малко данни за сериализиране)
+    chart_df = df if isinstance(df, EventTable) else df[['time', 'magnitude', 'depth', 'latitude', 'longitude']]
+    return render_charts({
+        'earthquakes_over_time': (plot_earthquakes_over_time, (chart_df,)),
+        'magnitude_distribution': (plot_magnitude_distribution, (chart_df,)),
+        'world_map': (create_world_map, (chart_df, start_date, end_date, min_magnitude)),
+        'seismicity_rates': (plot_seismicity_rates, (chart_df, start_date, end_date, min_magnitude)),
+    }, parallel=parallel, cancel_event=cancel_event, timings=timings)
+
+
+def analyze_and_visualize(df, start_date, end_date, min_magnitude, progress=None, cancel_event=None, timings=None):
+    # progress(stage) се извиква преди всеки етап; може да прекрати анализа с изключение.
+    # cancel_event прекратява и самите етапи (декластеризацията и изчакването на диаграмите).
+    # timings получава времето за изчертаване на всяка диаграма
+    report = progress or (lambda stage: None)
+
+    report('statistics')
+    activity_change_analysis = analyze_seismic_activity_change(df, start_date, end_date, min_magnitude)
+    analysis_results = analyze_earthquake_data(df, cancel_event=cancel_event, progress=report)
 
-    map_image = visualize_on_map(df, start_date, end_date, min_magnitude)
+    report('rendering')
+    images = visualize_earthquake_data(df, start_date, end_date, min_magnitude, cancel_event=cancel_event,
+                                       timings=timings)
 
     (result, top_earthquakes, most_affected_region, affected_region_count,
      correlation, seismic_hazard_assessment, aftershocks_analysis) = analysis_results
 
-    activity_change_analysis = analyze_seismic_activity_change(df, start_date, end_date, min_magnitude)
-
     return (result, top_earthquakes, most_affected_region, affected_region_count,
-            correlation, seismic_hazard_assessment, aftershocks_analysis, map_image, activity_change_analysis)
+            correlation, seismic_hazard_assessment, aftershocks_analysis, images, activity_change_analysis)
@@ -0,0 +1,230 @@
+import argparse
+import json
+import math
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from analyzer import analyze_earthquake_data, analyze_seismic_activity_change, visualize_earthquake_data
+from data_fetcher import USGS_BASE_URL, stream_earthquake_data
+from data_processor import process_stream
+from event_store import DEFAULT_STORE_PATH, EventStore
+from region_statistics import grouped_statistics
+from utils import CONTINENTS
+
+ALL_CONTINENTS = 'Всички'
+
+# Данните, общи за всички задачи в даден процес
+_shared_df = None
+
+
+def parse_job(job, index):
+    try:
+        parsed = {
+            'name': str(job.get('name') or f'job_{index + 1}'),
+            'start_date': datetime.strptime(job['start_date'], "%Y-%m-%d"),
+            'end_date': datetime.strptime(job['end_date'], "%Y-%m-%d"),
+            'min_magnitude': float(job['min_magnitude']),
+            'continent': job.get('continent', ALL_CONTINENTS),
+            'country': job.get('country'),
+            'charts': bool(job.get('charts', False)),
+        }
+    except KeyError as e:
+        raise ValueError(f"Задача {index + 1}: липсва поле {e}")
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Задача {index + 1}: невалидна стойност ({e})")
+
+    if parsed['start_date'] > parsed['end_date']:
+        raise ValueError(f"Задача {index + 1}: началната дата трябва да бъде преди крайната дата")
+    if parsed['continent'] != ALL_CONTINENTS and parsed['continent'] not in CONTINENTS:
+        raise ValueError(f"Задача {index + 1}: непознат континент '{parsed['continent']}'")
+    return parsed
+
+
+def load_jobs(path):
+    with open(path, encoding='utf-8') as f:
+        jobs = json.load(f)
+    if isinstance(jobs, dict):
+        jobs = jobs.get('jobs', [])
+    return [parse_job(job, i) for i, job in enumerate(jobs)]
+
+
+def select_events(df, job):
+    mask = ((df['time'] >= job['start_date']) & (df['time'] <= job['end_date'])
+            & (df['magnitude'] >= job['min_magnitude']))
+    if job['continent'] != ALL_CONTINENTS:
+        mask &= df['continent'] == job['continent']
+    if job['country']:
+        mask &= df['country'] == job['country']
+    return df[mask]
+
+
+def _init_worker(df):
+    global _shared_df
+    _shared_df = df
+
+
+def _file_name(name):
+    return re.sub(r'[^\w.-]+', '_', name)
+
+
+def _job_summary(job):
+    return {
+        'name': job['name'],
+        'start_date': job['start_date'].strftime("%Y-%m-%d"),
+        'end_date': job['end_date'].strftime("%Y-%m-%d"),
+        'min_magnitude': job['min_magnitude'],
+        'continent': job['continent'],
+        'country': job['country'],
+    }
+
+
+def empty_result(job):
+    # Резултат за задача без земетресения (напр. Антарктика при висок минимален магнитуд)
+    return {
+        **_job_summary(job),
+        'events': 0,
+        'mean_magnitude': None,
+        'mean_depth': None,
+        'most_affected_region': None,
+        'affected_region_count': 0,
+        'depth_magnitude_correlation': None,
+        'summary': "Няма земетресения, отговарящи на критериите на задачата.",
+        'top_earthquakes': '',
+        'seismic_hazard_assessment': None,
+        'aftershocks_analysis': None,
+        'activity_change_analysis': None,
+        'charts': {},
+    }
+
+
+def run_job(job, output_dir):
+    df = select_events(_shared_df, job)
+    if len(df) == 0:
+        return empty_result(job)
+
+    (result, top_earthquakes, most_affected_region, affected_region_count,
+     correlation, seismic_hazard_assessment, aftershocks_analysis) = analyze_earthquake_data(df)
+    activity_change_analysis = analyze_seismic_activity_change(df, job['start_date'], job['end_date'],
+                                                               job['min_magnitude'])
+
+    charts = {}
+    if job['charts']:
+        # Тази задача вече е в отделен процес, затова диаграмите се изчертават последователно
+        images = visualize_earthquake_data(df, job['start_date'], job['end_date'], job['min_magnitude'],
+                                           parallel=False)
+        for chart, png in images.items():
+            path = os.path.join(output_dir, f"{_file_name(job['name'])}_{chart}.png")
+            with open(path, 'wb') as f:
+                f.write(png)
+            charts[chart] = path
+
+    return {
+        **_job_summary(job),
+        'events': int(len(df)),
+        'mean_magnitude': float(df['magnitude'].mean()),
+        'mean_depth': float(df['depth'].mean()),
+        'most_affected_region': str(most_affected_region),
+        'affected_region_count': int(affected_region_count),
+        'depth_magnitude_correlation': float(correlation) if len(df) > 1 else None,
+        'summary': result,
+        'top_earthquakes': top_earthquakes,
+        'seismic_hazard_assessment': seismic_hazard_assessment,
+        'aftershocks_analysis': aftershocks_analysis,
+        'activity_change_analysis': activity_change_analysis,
+        'charts': charts,
+    }
+
+
+def json_safe(value):
+    # NaN и безкрайност не са валиден JSON - записват се като null
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: json_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [json_safe(item) for item in value]
+    return value
+
+
+def fetch_union(jobs, store, base_url=USGS_BASE_URL):
+    # Данните се изтеглят веднъж за обединението на всички периоди и най-ниския магнитуд.
+    # Събитията се обработват поточно на порции, без целият каталог да се пази като GeoJSON в паметта
+    start_date = min(job['start_date'] for job in jobs)
+    end_date = max(job['end_date'] for job in jobs)
+    min_magnitude = min(job['min_magnitude'] for job in jobs)
+    if store is None:
+        features = stream_earthquake_data(start_date, end_date, min_magnitude, base_url=base_url)
+    else:
+        store.sync(start_date, end_date, min_magnitude)
+        features = store.iter_load(start_date, end_date, min_magnitude)
+    return process_stream(features)
+
+
+def write_region_report(df, by, output_dir):
+    # Отчет за всички региони наведнъж върху общите данни
+    report = grouped_statistics(df, by=by)
+    path = os.path.join(output_dir, f'region_report_{by}.json')
+    report.reset_index().to_json(path, orient='records', force_ascii=False, indent=2)
+    return path
+
+
+def run_batch(jobs, output_dir, workers=None, store=None, base_url=USGS_BASE_URL, region_report=None):
+    os.makedirs(output_dir, exist_ok=True)
+    df = fetch_union(jobs, store, base_url)
+    print(f"Изтеглени {len(df)} земетресения за {len(jobs)} задачи", file=sys.stderr)
+
+    if region_report:
+        write_region_report(df, region_report, output_dir)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(df,)) as executor:
+        futures = [executor.submit(run_job, job, output_dir) for job in jobs]
+        results = []
+        for job, future in zip(jobs, futures):
+            try:
+                results.append(future.result())
+                print(f"Готово: {job['name']}", file=sys.stderr)
+            except Exception as e:
+                results.append({'name': job['name'], 'error': str(e)})
+                print(f"Грешка в {job['name']}: {e}", file=sys.stderr)
+
+    with open(os.path.join(output_dir, 'results.json'), 'w', encoding='utf-8') as f:
+        json.dump(json_safe(results), f, ensure_ascii=False, indent=2, allow_nan=False)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Пакетен анализ на сеизмична активност без графичен интерфейс')
+    parser.add_argument('jobs', help='JSON файл със списък от задачи')
+    parser.add_argument('-o', '--output', default='results', help='директория за резултатите')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='брой процеси за анализа')
+    parser.add_argument('--charts', action='store_true', help='диаграми за всички задачи')
+    parser.add_argument('--store', default=None, help='път до локалния каталог със събития')
+    parser.add_argument('--no-store', action='store_true', help='изтегляне без локален каталог')
+    parser.add_argument('--base-url', default=USGS_BASE_URL, help='адрес на FDSN услугата')
+    parser.add_argument('--region-report', choices=['continent', 'country', 'grid'],
+                        help='отчет за всички региони от избрания вид')
+    args = parser.parse_args(argv)
+
+    try:
+        jobs = load_jobs(args.jobs)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    if not jobs:
+        parser.error("Файлът не съдържа задачи")
+    if args.charts:
+        for job in jobs:
+            job['charts'] = True
+
+    store = None
+    if not args.no_store:
+        store = EventStore(args.store or DEFAULT_STORE_PATH, base_url=args.base_url)
+
+    results = run_batch(jobs, args.output, args.workers, store, args.base_url, args.region_report)
+    return 1 if any('error' in result for result in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,46 @@
+import argparse
+import tempfile
+import time
+
+import cartopy_maps
+from benchmarks.bench_process_data import make_features
+from data_processor import process_data
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Време за изчертаване на картата със студен и топъл кеш на основата')
+    parser.add_argument('--events', type=int, default=10_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = process_data(make_features(args.events))
+    start_date, end_date = df['time'].min(), df['time'].max()
+    map_args = (df, start_date, end_date, df['magnitude'].min())
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cartopy_maps.BASEMAP_CACHE_DIR = cache_dir
+
+        cartopy_maps.clear_basemap_cache(disk=True)
+        cold = timed(cartopy_maps.create_world_map, *map_args)
+
+        disk = []
+        for _ in range(args.repeat):
+            cartopy_maps.clear_basemap_cache()
+            disk.append(timed(cartopy_maps.create_world_map, *map_args))
+
+        memory = [timed(cartopy_maps.create_world_map, *map_args) for _ in range(args.repeat)]
+
+    print(f"{'кеш':>18} {'време (с)':>10}")
+    print(f"{'студен':>18} {cold:>10.2f}")
+    print(f"{'топъл (диск)':>18} {min(disk):>10.2f}")
+    print(f"{'топъл (памет)':>18} {min(memory):>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
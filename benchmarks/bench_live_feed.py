@@ -0,0 +1,111 @@
+import argparse
+import hashlib
+import json
+import statistics
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.bench_process_data import make_features
+from live_feed import FeedPoller, LiveCatalog, feed_latency, run_live
+
+
+class FakeFeed:
+    # Локален обобщен поток, който се държи като този на USGS (ETag, Last-Modified, 304)
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.features = {}
+        self.body = b''
+        self.etag = None
+        self.last_modified = None
+        self.publish([])
+
+    def publish(self, features):
+        with self.lock:
+            for feature in features:
+                self.features[feature['id']] = feature
+            now = time.time()
+            document = {'type': 'FeatureCollection',
+                        'metadata': {'generated': int(now * 1000), 'count': len(self.features)},
+                        'features': list(self.features.values())}
+            self.body = json.dumps(document).encode('utf-8')
+            self.etag = '"' + hashlib.md5(self.body).hexdigest() + '"'
+            self.last_modified = formatdate(now, usegmt=True)
+
+    def handler(self):
+        feed = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with feed.lock:
+                    body, etag, last_modified = feed.body, feed.etag, feed.last_modified
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('ETag', etag)
+                self.send_header('Last-Modified', last_modified)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Закъснение от обновяването на потока до обновяването на таблицата')
+    parser.add_argument('--updates', type=int, default=10, help='брой обновявания на потока')
+    parser.add_argument('--events', type=int, default=20, help='нови събития при всяко обновяване')
+    parser.add_argument('--period', type=float, default=1.0, help='секунди между обновяванията на потока')
+    parser.add_argument('--interval', type=float, default=0.2, help='интервал на допитване в секунди')
+    args = parser.parse_args()
+
+    feed = FakeFeed()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), feed.handler())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/all_hour.geojson"
+
+    latencies = []
+    received = []
+
+    def on_update(update):
+        received.append(len(update['new']) + len(update['updated']))
+        latencies.append(feed_latency(update['generated']))
+
+    poller = FeedPoller(url)
+    stop_event = threading.Event()
+    worker = threading.Thread(target=run_live, args=(poller, LiveCatalog(), on_update, args.interval, stop_event),
+                              daemon=True)
+    worker.start()
+
+    features = make_features(args.updates * args.events)['features']
+    for i in range(args.updates):
+        batch = features[i * args.events:(i + 1) * args.events]
+        if i > 0:
+            # Част от вече публикуваните събития се обновяват (нова версия на магнитуда)
+            revised = dict(features[(i - 1) * args.events], properties=dict(features[(i - 1) * args.events]['properties'],
+                                                                                updated=int(time.time() * 1000)))
+            batch = batch + [revised]
+        feed.publish(batch)
+        time.sleep(args.period)
+
+    stop_event.set()
+    worker.join()
+    server.shutdown()
+    poller.close()
+
+    print(f"обновявания на потока: {args.updates}, получени промени: {len(latencies)}, събития: {sum(received)}")
+    print(f"заявки: {poller.requests}, без промяна (304): {poller.not_modified}, байтове: {poller.bytes}")
+    if latencies:
+        print(f"закъснение (с): медиана {statistics.median(latencies):.3f}, максимум {max(latencies):.3f}")
+
+
+if __name__ == '__main__':
+    main()
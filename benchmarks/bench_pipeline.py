@@ -0,0 +1,144 @@
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import cartopy_maps
+from analyzer import (analyze_aftershocks, analyze_seismic_activity_change, plot_earthquakes_over_time,
+                      plot_magnitude_distribution, plot_seismicity_rates)
+from benchmarks.synthetic import START_TIME, catalog_bytes
+from data_processor import process_data
+from regions import assign_regions
+from seismicity_rates import rate_engine
+from utils import assess_seismic_hazard, pearson_correlation
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+DAYS = 365
+MIN_MAGNITUDE = 2.5
+TOLERANCE = 0.2  # допустимо забавяне спрямо базовите резултати
+
+
+def statistics(df, start_date, end_date):
+    # Статистиките от analyze_earthquake_data без декластеризацията, която се измерва отделно
+    pearson_correlation(df['depth'], df['magnitude'])
+    df.sort_values('magnitude', ascending=False).head(3)
+    country_counts = df['country'].value_counts()
+    assess_seismic_hazard(df, country_counts.index[0])
+    analyze_seismic_activity_change(df, start_date, end_date, MIN_MAGNITUDE)
+
+
+def pipeline_stages(body):
+    # Етапите в реда на изпълнение; всеки етап получава резултатите от предишните
+    start_date = pd.Timestamp(START_TIME, unit='ms').to_pydatetime()
+    end_date = start_date + timedelta(days=DAYS)
+    context = {}
+
+    def parse():
+        context['data'] = json.loads(body)
+
+    def continents():
+        features = context['data']['features']
+        assign_regions(np.array([feature['geometry']['coordinates'][1] for feature in features]),
+                       np.array([feature['geometry']['coordinates'][0] for feature in features]))
+
+    def process():
+        context['df'] = process_data(context['data'])
+
+    return [
+        ('parse', parse),
+        ('continents', continents),
+        ('process_data', process),
+        ('statistics', lambda: statistics(context['df'], start_date, end_date)),
+        ('declustering', lambda: analyze_aftershocks(context['df'])),
+        ('rates', lambda: rate_engine(context['df'], start_date, end_date, by='grid')),
+        ('chart_time', lambda: plot_earthquakes_over_time(context['df'])),
+        ('chart_magnitudes', lambda: plot_magnitude_distribution(context['df'])),
+        ('chart_rates', lambda: plot_seismicity_rates(context['df'], start_date, end_date, MIN_MAGNITUDE)),
+        ('world_map', lambda: cartopy_maps.create_world_map(context['df'], start_date, end_date, MIN_MAGNITUDE)),
+    ]
+
+
+def run_stages(body, repeat, memory):
+    results = {}
+    for name, stage in pipeline_stages(body):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            stage()
+            timings.append(time.perf_counter() - started)
+        result = {'seconds': min(timings)}
+        if memory:
+            tracemalloc.start()
+            stage()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            result['peak_bytes'] = peak
+        results[name] = result
+    return results
+
+
+def compare(results, baseline, tolerance):
+    # Етапите, които са по-бавни от базовите резултати с повече от tolerance
+    regressions = []
+    for size, stages in results.items():
+        for stage, result in stages.items():
+            reference = baseline.get(size, {}).get(stage)
+            if reference and result['seconds'] > reference['seconds'] * (1 + tolerance):
+                regressions.append((size, stage, reference['seconds'], result['seconds']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Време и памет за всеки етап на анализа върху синтетичен каталог')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='брой събития (1000 до 1000000)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-memory', action='store_true', help='без измерване на пиковата памет (по-бързо)')
+    parser.add_argument('--blank-basemap', action='store_true',
+                        help='празна основа на картата (без данни от Natural Earth, напр. без мрежа)')
+    parser.add_argument('-o', '--output', help='JSON файл за резултатите')
+    parser.add_argument('--compare', help='JSON файл с базови резултати за сравнение')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    if args.blank_basemap:
+        cartopy_maps.get_basemap = lambda projection, *rest: np.zeros((2, 2, 4), dtype=np.uint8)
+
+    results = {}
+    print(f"{'събития':>10} {'етап':>18} {'време (с)':>10} {'пик памет (MB)':>16}")
+    for size in args.sizes:
+        body = catalog_bytes(size, args.seed, days=DAYS, min_magnitude=MIN_MAGNITUDE)
+        stages = run_stages(body, args.repeat, not args.no_memory)
+        results[str(size)] = stages
+        for stage, result in stages.items():
+            peak = f"{result['peak_bytes'] / 1e6:>16.1f}" if 'peak_bytes' in result else f"{'-':>16}"
+            print(f"{size:>10} {stage:>18} {result['seconds']:>10.3f} {peak}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'seed': args.seed,
+                'environment': {'python': platform.python_version(), 'numpy': np.__version__,
+                                'pandas': pd.__version__, 'machine': platform.machine()},
+                'results': results,
+            }, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        for size, stage, before, after in regressions:
+            print(f"Забавяне: {stage} при {size} събития - {before:.3f} с -> {after:.3f} с", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
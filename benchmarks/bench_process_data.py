@@ -0,0 +1,86 @@
+import argparse
+import random
+import time
+import tracemalloc
+
+import pandas as pd
+
+from data_processor import process_data
+from utils import get_continent
+
+PLACES = ['Japan', 'Indonesia', 'Chile', 'Alaska', 'CA', 'Tonga', 'Peru', 'Greece', 'Turkey', 'Philippines']
+
+
+def legacy_process_data(data):
+    # Предишната реализация (обект по обект), запазена за сравнение
+    features = data['features']
+    processed_data = []
+    for feature in features:
+        properties = feature['properties']
+        coordinates = feature['geometry']['coordinates']
+        latitude = coordinates[1]
+        longitude = coordinates[0]
+        country = properties.get('place', '').split(', ')[-1] if properties.get('place') else 'Неизвестна'
+        processed_data.append({
+            'magnitude': properties['mag'],
+            'place': properties['place'],
+            'time': pd.to_datetime(properties['time'], unit='ms'),
+            'depth': coordinates[2],
+            'latitude': latitude,
+            'longitude': longitude,
+            'country': country,
+            'nearest_city': properties.get('place'),
+            'continent': get_continent(latitude, longitude)
+        })
+    return pd.DataFrame(processed_data)
+
+
+def make_features(count, seed=0):
+    rng = random.Random(seed)
+    start = 1704067200000  # 2024-01-01
+    features = []
+    for i in range(count):
+        place = f"{rng.randint(1, 150)} km {rng.choice('NSEW')} of Town {rng.randint(1, 500)}, {rng.choice(PLACES)}"
+        features.append({
+            'type': 'Feature',
+            'id': f'bench{i}',
+            'properties': {'mag': round(rng.uniform(2.5, 8.0), 1), 'place': place,
+                           'time': start + rng.randint(0, 365 * 24 * 3600 * 1000)},
+            'geometry': {'type': 'Point',
+                         'coordinates': [rng.uniform(-180, 180), rng.uniform(-80, 80), rng.uniform(0, 700)]}
+        })
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def measure(function, data):
+    started = time.perf_counter()
+    function(data)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    function(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сравнение на process_data с предишната реализация')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--legacy-max', type=int, default=1_000_000,
+                        help='най-голям брой събития, за които се изпълнява предишната реализация')
+    args = parser.parse_args()
+
+    print(f"{'събития':>10} {'реализация':>12} {'редове/с':>12} {'пик памет (MB)':>16}")
+    for size in args.sizes:
+        data = make_features(size)
+        implementations = [('колонна', process_data)]
+        if size <= args.legacy_max:
+            implementations.append(('предишна', legacy_process_data))
+        for name, function in implementations:
+            elapsed, peak = measure(function, data)
+            print(f"{size:>10} {name:>12} {size / elapsed:>12,.0f} {peak / 2 ** 20:>16.1f}")
+
+
+if __name__ == '__main__':
+    main()
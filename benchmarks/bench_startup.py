@@ -0,0 +1,68 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Пакети, които не трябва да се зареждат при импортиране на съответния модул
+LAZY_PACKAGES = {
+    'gui': ['numpy', 'pandas', 'matplotlib', 'cartopy', 'shapely'],
+    'batch': ['matplotlib', 'cartopy', 'shapely'],
+}
+MAX_SECONDS = 1.0
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_in_subprocess(module):
+    # Импорт в нов интерпретатор; връща (време в секунди, заредени пакети) или грешката
+    code = (f"import json, sys, time\n"
+            f"started = time.perf_counter()\n"
+            f"import {module}\n"
+            f"elapsed = time.perf_counter() - started\n"
+            f"print(json.dumps([elapsed, sorted({{name.split('.')[0] for name in sys.modules}})]))")
+    completed = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True)
+    if completed.returncode != 0:
+        return None, completed.stderr.strip().splitlines()[-1]
+    elapsed, packages = json.loads(completed.stdout.strip().splitlines()[-1])
+    return elapsed, packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Време за стартиране и проверка за отложено зареждане на тежките пакети')
+    parser.add_argument('--modules', nargs='+', default=list(LAZY_PACKAGES))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--max-seconds', type=float, default=MAX_SECONDS,
+                        help='най-голямо допустимо време за импорт на модул')
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'модул':>8} {'импорт (с)':>11} {'общо (с)':>10}  рано заредени пакети")
+    for module in args.modules:
+        imports, totals = [], []
+        packages = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            elapsed, packages = import_in_subprocess(module)
+            totals.append(time.perf_counter() - started)
+            if elapsed is None:
+                break
+            imports.append(elapsed)
+        if not imports:
+            print(f"{module:>8} {'-':>11} {'-':>10}  не може да бъде импортиран: {packages}")
+            failed = True
+            continue
+
+        eager = [package for package in LAZY_PACKAGES.get(module, []) if package in packages]
+        seconds = statistics.median(imports)
+        print(f"{module:>8} {seconds:>11.3f} {statistics.median(totals):>10.3f}  {', '.join(eager) or '-'}")
+        failed = failed or bool(eager) or seconds > args.max_seconds
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
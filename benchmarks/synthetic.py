@@ -0,0 +1,98 @@
+import json
+
+import numpy as np
+
+START_TIME = 1704067200000  # 2024-01-01 в милисекунди
+MS_PER_DAY = 24 * 60 * 60 * 1000
+
+# Сеизмично активни области: (ширина, дължина, разсейване в градуси, регион в описанието на мястото)
+SOURCE_REGIONS = [
+    (38.0, 142.0, 4.0, 'Japan'),
+    (-6.0, 130.0, 8.0, 'Indonesia'),
+    (-25.0, -70.0, 6.0, 'Chile'),
+    (57.0, -155.0, 5.0, 'Alaska'),
+    (36.0, -118.0, 3.0, 'CA'),
+    (-20.0, -175.0, 4.0, 'Tonga'),
+    (-12.0, -76.0, 4.0, 'Peru'),
+    (38.5, 23.0, 2.0, 'Greece'),
+    (39.0, 36.0, 3.0, 'Turkey'),
+    (12.0, 124.0, 4.0, 'Philippines'),
+    (-41.0, 174.0, 3.0, 'New Zealand'),
+    (15.0, -92.0, 3.0, 'Mexico'),
+    (30.0, 82.0, 4.0, 'Nepal'),
+    (-2.0, -15.0, 10.0, 'Mid-Atlantic Ridge'),
+]
+DIRECTIONS = np.array(['N', 'NNE', 'NE', 'ENE', 'E', 'ESE', 'SE', 'SSE', 'S', 'SSW', 'SW', 'WSW', 'W', 'WNW', 'NW', 'NNW'])
+
+
+def gutenberg_richter(rng, count, min_magnitude, b_value=1.0, max_magnitude=9.5):
+    # Магнитуди с честота log10 N = a - bM, отрязани при max_magnitude
+    span = 1 - 10 ** (-b_value * (max_magnitude - min_magnitude))
+    return min_magnitude - np.log10(1 - rng.random(count) * span) / b_value
+
+
+def synthetic_catalog(count, seed=0, days=365, min_magnitude=2.5, b_value=1.0, aftershock_fraction=0.5,
+                      omori_p=1.1, omori_c=0.01):
+    # Каталог във формата на USGS GeoJSON с главни земетресения и последователности от афтършокове
+    rng = np.random.default_rng(seed)
+    main_count = max(1, int(round(count * (1 - aftershock_fraction))))
+    after_count = count - main_count
+
+    regions = rng.integers(len(SOURCE_REGIONS), size=main_count)
+    centers = np.array([region[:3] for region in SOURCE_REGIONS])
+    main_lat = centers[regions, 0] + rng.normal(size=main_count) * centers[regions, 2]
+    main_lon = centers[regions, 1] + rng.normal(size=main_count) * centers[regions, 2]
+    main_time = START_TIME + rng.integers(0, days * MS_PER_DAY, size=main_count)
+    main_mag = gutenberg_richter(rng, main_count, min_magnitude, b_value)
+
+    # Продуктивност по магнитуда: броят афтършокове расте 10 пъти с всяка единица магнитуд
+    productivity = 10 ** (main_mag - min_magnitude)
+    parents = rng.choice(main_count, size=after_count, p=productivity / productivity.sum())
+
+    # Закон на Омори: n(t) ~ 1 / (c + t)^p, времето е в дни. Закъснението се тегли от разпределението,
+    # отрязано до края на периода, за да не се натрупват афтършокове в последната милисекунда
+    end_time = START_TIME + days * MS_PER_DAY - 1
+    remaining_days = (end_time - main_time[parents]) / MS_PER_DAY
+    truncation = 1 - (1 + remaining_days / omori_c) ** (1 - omori_p)
+    u = rng.random(after_count) * truncation
+    delay_days = omori_c * ((1 - u) ** (1 / (1 - omori_p)) - 1)
+    # Размер на разкъсването (км) по Уелс-Копърсмит
+    rupture_km = 10 ** (0.5 * main_mag[parents] - 1.8)
+    spread = rupture_km / 111
+    after_lat = main_lat[parents] + rng.normal(size=after_count) * spread
+    after_lon = main_lon[parents] + rng.normal(size=after_count) * spread
+    after_time = main_time[parents] + (delay_days * MS_PER_DAY).astype(np.int64)
+    after_mag = np.minimum(gutenberg_richter(rng, after_count, min_magnitude, b_value), main_mag[parents] - 0.1)
+
+    latitude = np.clip(np.concatenate([main_lat, after_lat]), -89.9, 89.9)
+    longitude = (np.concatenate([main_lon, after_lon]) + 180) % 360 - 180
+    times = np.concatenate([main_time, after_time])
+    magnitude = np.round(np.maximum(np.concatenate([main_mag, after_mag]), min_magnitude), 2)
+    region_names = np.array([region[3] for region in SOURCE_REGIONS], dtype=object)
+    region = region_names[np.concatenate([regions, regions[parents]])]
+    # Повечето земетресения са плитки, малка част са дълбоки (до 700 км)
+    depth = np.where(rng.random(count) < 0.9, rng.exponential(15, size=count), rng.uniform(70, 700, size=count))
+    distance = rng.integers(1, 150, size=count)
+    direction = DIRECTIONS[rng.integers(len(DIRECTIONS), size=count)]
+    town = rng.integers(1, 500, size=count)
+    updated = times + rng.integers(60_000, 7 * MS_PER_DAY, size=count)
+
+    order = np.argsort(-times, kind='stable')  # USGS връща най-новите събития първи
+    columns = zip(order.tolist(), magnitude[order].tolist(), distance[order].tolist(), direction[order].tolist(),
+                  town[order].tolist(), region[order].tolist(), times[order].tolist(), updated[order].tolist(),
+                  longitude[order].tolist(), latitude[order].tolist(), np.round(depth[order], 2).tolist())
+    features = []
+    for i, mag, km, bearing, town_number, region_name, time, updated_time, lon, lat, depth_km in columns:
+        features.append({
+            'type': 'Feature',
+            'id': f'syn{i}',
+            'properties': {'mag': mag, 'place': f"{km} km {bearing} of Town {town_number}, {region_name}",
+                           'time': time, 'updated': updated_time},
+            'geometry': {'type': 'Point', 'coordinates': [lon, lat, depth_km]}
+        })
+    return {'type': 'FeatureCollection', 'metadata': {'count': count}, 'features': features}
+
+
+def catalog_bytes(count, seed=0, **kwargs):
+    # Каталогът сериализиран като отговор на услугата
+    return json.dumps(synthetic_catalog(count, seed, **kwargs)).encode('utf-8')
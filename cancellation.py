@@ -0,0 +1,7 @@
+class AnalysisCancelled(Exception):
+    pass
+
+
+def check_cancelled(cancel_event):
+    if cancel_event is not None and cancel_event.is_set():
+        raise AnalysisCancelled("Анализът е прекратен от потребителя")
@@ -1,15 +1,164 @@
-import matplotlib.pyplot as plt
+import hashlib
+import math
+import os
+import tempfile
+
 import cartopy.crs as ccrs
 import cartopy.feature as cfeature
+import matplotlib.image as mpimg
+import numpy as np
 from cartopy.mpl.ticker import LongitudeFormatter, LatitudeFormatter
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.colors import LogNorm
+from matplotlib.figure import Figure
 
+from event_table import EventTable
+from rendering import figure_to_png
 
-def create_world_map(df, start_date, end_date, min_magnitude):
-    # Създаване на фигура и оси
-    plt.figure(figsize=(14, 6))
-    ax = plt.axes(projection=ccrs.Mercator())
+BASEMAP_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.earthquake_analyzer', 'basemaps')
+MAP_FIGSIZE = (14, 6)
+MAP_DPI = 300
+DENSITY_THRESHOLD = 50_000  # Над този брой събития картата се изчертава като решетка вместо точки
+DENSITY_CELL_SIZE = 1.0  # градуси
+
+DENSITY_STATISTICS = {
+    'count': 'Брой земетресения',
+    'max_magnitude': 'Максимален магнитуд',
+    'energy': 'Освободена енергия (J)',
+}
+
+# Кеш в паметта: ключ (проекция, обхват, dpi, ширина на осите) -> RGBA масив
+_basemaps = {}
+
+
+def add_base_features(ax):
     # Добавяне на брегова линия
     ax.coastlines('10m')
+    # Добавяне на характеристики на картата
+    ax.add_feature(cfeature.LAND)
+    ax.add_feature(cfeature.OCEAN)
+    ax.add_feature(cfeature.COASTLINE, edgecolor='gray', linewidth=0.08)
+    ax.add_feature(cfeature.BORDERS, edgecolor='gray', linestyle=':', linewidth=0.08)
+    ax.add_feature(cfeature.LAKES, alpha=0.5)
+    ax.add_feature(cfeature.RIVERS)
+
+
+def global_extent(projection):
+    return (*projection.x_limits, *projection.y_limits)
+
+
+def render_basemap(projection, extent, dpi, width):
+    # Статичната география се изчертава веднъж върху оси, които заемат цялата фигура
+    height = width * (extent[3] - extent[2]) / (extent[1] - extent[0])
+    fig = Figure(figsize=(width, height), dpi=dpi)
+    ax = fig.add_axes([0, 0, 1, 1], projection=projection)
+    ax.set_xlim(extent[0], extent[1])
+    ax.set_ylim(extent[2], extent[3])
+    ax.spines['geo'].set_visible(False)
+    add_base_features(ax)
+    canvas = FigureCanvasAgg(fig)
+    canvas.draw()
+    return np.asarray(canvas.buffer_rgba()).copy()
+
+
+def _basemap_path(key):
+    digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(BASEMAP_CACHE_DIR, f'basemap_{digest}.png')
+
+
+def get_basemap(projection, dpi=MAP_DPI, width=MAP_FIGSIZE[0]):
+    extent = global_extent(projection)
+    key = (projection.proj4_init, tuple(round(value, 3) for value in extent), dpi, width)
+    basemap = _basemaps.get(key)
+    if basemap is not None:
+        return basemap
+
+    path = _basemap_path(key)
+    if os.path.exists(path):
+        basemap = (mpimg.imread(path) * 255).round().astype(np.uint8)
+    else:
+        basemap = render_basemap(projection, extent, dpi, width)
+        # Запис през временен файл, за да не се четат наполовина записани карти от други процеси
+        os.makedirs(BASEMAP_CACHE_DIR, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(suffix='.png', dir=BASEMAP_CACHE_DIR)
+        os.close(fd)
+        mpimg.imsave(temp_path, basemap)
+        os.replace(temp_path, path)
+
+    _basemaps[key] = basemap
+    return basemap
+
+
+def axes_width(ax):
+    # Ширината на осите в инчове след мястото за цветната лента и запазването на пропорциите на проекцията;
+    # основата се изчертава точно с толкова пиксела, за да не се мащабира при показване
+    ax.apply_aspect()
+    return float(round(ax.get_position().width * ax.figure.get_figwidth(), 2))
+
+
+def clear_basemap_cache(disk=False):
+    _basemaps.clear()
+    if disk and os.path.isdir(BASEMAP_CACHE_DIR):
+        for name in os.listdir(BASEMAP_CACHE_DIR):
+            if name.startswith('basemap_') and name.endswith('.png'):
+                os.remove(os.path.join(BASEMAP_CACHE_DIR, name))
+
+
+def latitude_range(projection):
+    # Обхватът по ширина на проекцията (при Меркатор - от -80 до 84 градуса)
+    x = float(np.mean(projection.x_limits))
+    points = ccrs.PlateCarree().transform_points(projection, np.array([x, x]), np.array(projection.y_limits))
+    return float(points[0, 1]), float(points[1, 1])
+
+
+def aggregate_events(longitudes, latitudes, magnitudes, cell_size=DENSITY_CELL_SIZE, lat_range=(-90, 90)):
+    # Натрупване на събитията в решетка по дължина/ширина; връща ръбовете на клетките и решетките.
+    # Решетката покрива само lat_range - събитията извън него се отнасят към крайния ред
+    longitudes = np.asarray(longitudes, dtype=float)
+    latitudes = np.asarray(latitudes, dtype=float)
+    magnitudes = np.asarray(magnitudes, dtype=float)
+    lat_min = max(-90.0, math.floor(lat_range[0] / cell_size) * cell_size)
+    lat_max = min(90.0, math.ceil(lat_range[1] / cell_size) * cell_size)
+    lon_edges = np.arange(-180, 180 + cell_size, cell_size)
+    lat_edges = lat_min + cell_size * np.arange(round((lat_max - lat_min) / cell_size) + 1)
+    nx, ny = len(lon_edges) - 1, len(lat_edges) - 1
+
+    valid = np.isfinite(longitudes) & np.isfinite(latitudes) & np.isfinite(magnitudes)
+    ix = np.clip(((longitudes[valid] + 180) // cell_size).astype(np.int64), 0, nx - 1)
+    iy = np.clip(((latitudes[valid] - lat_min) // cell_size).astype(np.int64), 0, ny - 1)
+    cells = iy * nx + ix
+    magnitudes = magnitudes[valid]
+
+    count = np.bincount(cells, minlength=nx * ny).astype(float)
+    # Енергия по Гутенберг-Рихтер: log10(E) = 1.5M + 4.8
+    energy = np.bincount(cells, weights=10 ** (1.5 * magnitudes + 4.8), minlength=nx * ny)
+    max_magnitude = np.full(nx * ny, np.nan)
+    np.fmax.at(max_magnitude, cells, magnitudes)
+
+    grids = {
+        'count': count.reshape(ny, nx),
+        'max_magnitude': max_magnitude.reshape(ny, nx),
+        'energy': energy.reshape(ny, nx),
+    }
+    return lon_edges, lat_edges, grids
+
+
+def draw_density(ax, filtered_df, statistic):
+    # Полярните редове са извън проекцията (при Меркатор се разтягат безкрайно) и не се изчертават
+    lon_edges, lat_edges, grids = aggregate_events(filtered_df['longitude'], filtered_df['latitude'],
+                                                   filtered_df['magnitude'], lat_range=latitude_range(ax.projection))
+    grid = np.ma.masked_where(~(grids['count'] > 0), grids[statistic])
+    norm = None if statistic == 'max_magnitude' or grid.count() == 0 else LogNorm()
+    return ax.pcolormesh(lon_edges, lat_edges, grid, cmap='jet', norm=norm, alpha=0.7, shading='flat',
+                         transform=ccrs.PlateCarree())
+
+
+def create_world_map(df, start_date, end_date, min_magnitude, density_threshold=DENSITY_THRESHOLD,
+                     statistic='count'):
+    # Създаване на фигура и оси
+    projection = ccrs.Mercator()
+    fig = Figure(figsize=MAP_FIGSIZE)
+    ax = fig.add_subplot(1, 1, 1, projection=projection)
     # Настройка на осите
     ax.set_global()
     ax.set_xticks(range(-180, 181, 30), crs=ccrs.PlateCarree())
@@ -19,38 +168,41 @@ def create_world_map(df, start_date, end_date, min_magnitude):
     lat_formatter = LatitudeFormatter()
     ax.xaxis.set_major_formatter(lon_formatter)
     ax.yaxis.set_major_formatter(lat_formatter)
-    # Добавяне на характеристики на картата
-    ax.add_feature(cfeature.LAND)
-    ax.add_feature(cfeature.OCEAN)
-    ax.add_feature(cfeature.COASTLINE, edgecolor='gray', linewidth=0.08)
-    ax.add_feature(cfeature.BORDERS, edgecolor='gray', linestyle=':', linewidth=0.08)
-    ax.add_feature(cfeature.LAKES, alpha=0.5)
-    ax.add_feature(cfeature.RIVERS)
 
-    # Филтриране на земетресенията
+    # Филтриране на земетресенията (компактната таблица се филтрира преди декодиране на колоните)
+    if isinstance(df, EventTable):
+        df = df.select(start_date, end_date, min_magnitude).to_frame(['time', 'magnitude', 'latitude', 'longitude'])
     mask = (df['time'] >= start_date) & (df['time'] <= end_date) & (df['magnitude'] >= min_magnitude)
     filtered_df = df[mask]
 
-    # Визуализиране на земетресенията
-    scatter = ax.scatter(filtered_df['longitude'], filtered_df['latitude'],
-                         c=filtered_df['magnitude'], cmap='jet',
-                         s=filtered_df['magnitude'] ** 0.7, alpha=0.4,
-                         transform=ccrs.PlateCarree())
+    # Визуализиране на земетресенията - при много събития като решетка, иначе като точки
+    if density_threshold is not None and len(filtered_df) > density_threshold:
+        layer = draw_density(ax, filtered_df, statistic)
+        label = DENSITY_STATISTICS[statistic]
+    else:
+        layer = ax.scatter(filtered_df['longitude'], filtered_df['latitude'],
+                           c=filtered_df['magnitude'], cmap='jet',
+                           s=filtered_df['magnitude'] ** 0.7, alpha=0.4,
+                           transform=ccrs.PlateCarree())
+        label = 'Магнитуд на земетресението'
 
     # Добавяне на цветна лента
-    cbar = plt.colorbar(scatter, ax=ax, orientation='vertical', pad=0, shrink=0.3)
-    cbar.set_label('Магнитуд на земетресението', fontsize=6)
+    cbar = fig.colorbar(layer, ax=ax, orientation='vertical', pad=0, shrink=0.3)
+    cbar.set_label(label, fontsize=6)
     cbar.ax.tick_params(labelsize=5)
 
+    # Кеширана основа на картата (брегове, суша, океани, граници, езера и реки) с размера на осите
+    ax.imshow(get_basemap(projection, MAP_DPI, axes_width(ax)), extent=global_extent(projection),
+              transform=projection, origin='upper', interpolation='antialiased')
+    ax.set_global()
+
     # Добавяне на заглавие
-    plt.title(
+    ax.set_title(
         f'Земетресения\n{start_date.strftime("%Y-%m-%d")} до {end_date.strftime("%Y-%m-%d")}')
 
-    # Запазване на картата като изображение
-    plt.savefig('world_map.png', dpi=300, bbox_inches='tight')
-    plt.close()
+    # Картата се връща като PNG в паметта
+    return figure_to_png(fig, dpi=MAP_DPI, bbox_inches='tight')
 
 
 def visualize_on_map(df, start_date, end_date, min_magnitude):
-    create_world_map(df, start_date, end_date, min_magnitude)
-    return 'world_map.png'
+    return create_world_map(df, start_date, end_date, min_magnitude)
@@ -1,13 +1,238 @@
+import io
+import math
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from cancellation import check_cancelled
+from json_stream import iter_features
+
+USGS_BASE_URL = "https://earthquake.usgs.gov/fdsnws/event/1"
+MAX_EVENTS_PER_REQUEST = 20000  # Ограничение на FDSN услугата за една заявка
+MIN_WINDOW = timedelta(minutes=1)
+DEFAULT_TIMEOUT = (10, 120)  # (свързване, четене) в секунди
+DEFAULT_WORKERS = 4
+DOWNLOAD_CHUNK_SIZE = 1 << 16
+
+
+def create_session(max_workers=DEFAULT_WORKERS, retries=5, backoff_factor=0.5):
+    # Обща сесия с пул от връзки и автоматични повторни опити при временни грешки
+    session = requests.Session()
+    retry = Retry(total=retries, backoff_factor=backoff_factor,
+                  status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=frozenset(['GET']))
+    adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def _to_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+def _format_time(value):
+    return value.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3]
 
 
-def fetch_earthquake_data(start_date, end_date, min_magnitude):
-    url = f"https://earthquake.usgs.gov/fdsnws/event/1/query"
+def _query_params(start, end, min_magnitude, updated_after=None):
     params = {
         "format": "geojson",
-        "starttime": start_date,
-        "endtime": end_date,
+        "starttime": _format_time(start),
+        "endtime": _format_time(end),
         "minmagnitude": min_magnitude
     }
-    response = requests.get(url, params=params)
-    return response.json()
+    if updated_after is not None:
+        params["updatedafter"] = _format_time(updated_after)
+    return params
+
+
+def count_earthquakes(session, start, end, min_magnitude, base_url=USGS_BASE_URL, updated_after=None):
+    response = session.get(f"{base_url}/count", params=_query_params(start, end, min_magnitude, updated_after),
+                           timeout=DEFAULT_TIMEOUT)
+    response.raise_for_status()
+    return int(response.json()['count'])
+
+
+def _split_window(start, end, parts):
+    step = (end - start) / parts
+    bounds = [start + step * i for i in range(parts)] + [end]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def split_time_range(session, executor, start, end, min_magnitude, base_url=USGS_BASE_URL,
+                     limit=MAX_EVENTS_PER_REQUEST, updated_after=None, cancel_event=None):
+    # Разделяне на периода на подпериоди, всеки от които е под ограничението на услугата
+    windows = []
+    pending = [(start, end)]
+    while pending:
+        check_cancelled(cancel_event)
+        counts = list(executor.map(lambda window: count_earthquakes(session, window[0], window[1], min_magnitude,
+                                                                    base_url, updated_after), pending))
+        next_pending = []
+        for (window_start, window_end), count in zip(pending, counts):
+            if count <= limit or window_end - window_start <= MIN_WINDOW:
+                if count > 0:
+                    windows.append((window_start, window_end, count))
+            else:
+                # Запас от 20%, тъй като събитията не са равномерно разпределени във времето
+                parts = max(2, math.ceil(count / (limit * 0.8)))
+                next_pending.extend(_split_window(window_start, window_end, parts))
+        pending = next_pending
+    return sorted(windows)
+
+
+class _ResponseStream(io.RawIOBase):
+    # Тялото на отговора като файлов обект за iter_features: чете се на части по DOWNLOAD_CHUNK_SIZE,
+    # като преди всяка част се проверява за прекратяване
+    def __init__(self, response, cancel_event=None):
+        self.chunks = response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE)
+        self.cancel_event = cancel_event
+        self.pending = b''
+        self.bytes = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.pending:
+            check_cancelled(self.cancel_event)
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                return 0
+            self.pending = chunk
+            self.bytes += len(chunk)
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+
+def _open_window(session, start, end, min_magnitude, base_url, updated_after=None, cancel_event=None):
+    # Изпраща заявката и връща отговора веднага след заглавията; тялото се чете от _iter_window
+    check_cancelled(cancel_event)
+    response = session.get(f"{base_url}/query", params=_query_params(start, end, min_magnitude, updated_after),
+                           timeout=DEFAULT_TIMEOUT, stream=True)
+    try:
+        response.raise_for_status()
+    except Exception:
+        response.close()
+        raise
+    return response
+
+
+def _iter_window(response, cancel_event=None, stats=None):
+    # Събитията се разбират едно по едно, докато тялото се изтегля - нито целият отговор,
+    # нито всички речници от него са в паметта едновременно
+    with response:
+        stream = _ResponseStream(response, cancel_event)
+        try:
+            yield from iter_features(io.TextIOWrapper(io.BufferedReader(stream, DOWNLOAD_CHUNK_SIZE),
+                                                      encoding='utf-8'))
+        finally:
+            if stats is not None:
+                stats['bytes'] += stream.bytes
+
+
+def _close_pending(futures):
+    # Неизпратените заявки се отменят, а отворените отговори се затварят, за да се освободят връзките
+    for future in futures:
+        if future.cancel():
+            continue
+        try:
+            future.result().close()
+        except Exception:
+            pass
+
+
+def merge_features(feature_lists):
+    # Обединяване и премахване на дублиращи се събития по идентификатор (запазва се най-новата версия)
+    merged = {}
+    for features in feature_lists:
+        for feature in features:
+            event_id = feature.get('id')
+            existing = merged.get(event_id)
+            if existing is None or ((feature['properties'].get('updated') or 0) >
+                                    (existing['properties'].get('updated') or 0)):
+                merged[event_id] = feature
+    return sorted(merged.values(), key=lambda feature: feature['properties'].get('time') or 0, reverse=True)
+
+
+def stream_earthquake_data(start_date, end_date, min_magnitude, base_url=USGS_BASE_URL,
+                           max_workers=DEFAULT_WORKERS, session=None, updated_after=None, cancel_event=None,
+                           limit=MAX_EVENTS_PER_REQUEST, stats=None):
+    # Поточно изтегляне: заявките за подпериодите се изпращат паралелно (до max_workers отворени отговора),
+    # а събитията се връщат по ред (от най-новия към най-стария), докато се разбира тялото на текущия отговор.
+    # stats (ако е подаден) се попълва с броя подпериоди и изтеглените байтове.
+    start = _to_datetime(start_date)
+    end = _to_datetime(end_date)
+    own_session = session is None
+    if own_session:
+        session = create_session(max_workers)
+    if stats is not None:
+        stats.update(windows=0, bytes=0)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            windows = split_time_range(session, executor, start, end, min_magnitude, base_url, limit=limit,
+                                       updated_after=updated_after, cancel_event=cancel_event)
+            if stats is not None:
+                stats['windows'] = len(windows)
+
+            pending = deque()
+            remaining = iter(reversed(windows))
+            seen = set()  # Събития на границата между два подпериода се връщат само веднъж
+            try:
+                while True:
+                    while len(pending) < max_workers:
+                        window = next(remaining, None)
+                        if window is None:
+                            break
+                        pending.append(executor.submit(_open_window, session, window[0], window[1], min_magnitude,
+                                                       base_url, updated_after, cancel_event))
+                    if not pending:
+                        break
+                    for feature in _iter_window(pending.popleft().result(), cancel_event, stats):
+                        event_id = feature.get('id')
+                        if event_id in seen:
+                            continue
+                        seen.add(event_id)
+                        yield feature
+            finally:
+                _close_pending(pending)
+    finally:
+        if own_session:
+            session.close()
+
+
+def fetch_earthquake_data(start_date, end_date, min_magnitude, base_url=USGS_BASE_URL,
+                          max_workers=DEFAULT_WORKERS, session=None, updated_after=None, cancel_event=None,
+                          limit=MAX_EVENTS_PER_REQUEST):
+    # Целият резултат в паметта (за поточна обработка - stream_earthquake_data)
+    stats = {}
+    started = time.perf_counter()
+    features = merge_features([list(stream_earthquake_data(start_date, end_date, min_magnitude, base_url,
+                                                           max_workers, session, updated_after, cancel_event,
+                                                           limit, stats))])
+    elapsed = time.perf_counter() - started
+    total_bytes = stats['bytes']
+
+    return {
+        "type": "FeatureCollection",
+        "metadata": {
+            "count": len(features),
+            "windows": stats['windows'],
+            "bytes": total_bytes,
+            "seconds": elapsed,
+            "events_per_second": len(features) / elapsed if elapsed > 0 else 0.0,
+            "bytes_per_second": total_bytes / elapsed if elapsed > 0 else 0.0
+        },
+        "features": features
+    }
@@ -1,25 +1,95 @@
+import numpy as np
 import pandas as pd
-from utils import get_continent
+from pandas.api.types import union_categoricals
+from utils import CONTINENTS
+
+UNKNOWN_COUNTRY = 'Неизвестна'
+STREAM_CHUNK_SIZE = 50_000  # Брой събития в една порция при поточна обработка
+COLUMNS = ['magnitude', 'place', 'time', 'depth', 'latitude', 'longitude', 'country', 'nearest_city', 'continent']
+
+
+def extract_columns(features):
+    # Едно преминаване през обектите, след което всичко е в NumPy масиви
+    rows = [(feature['properties']['mag'], feature['properties']['time'], feature['properties'].get('place'),
+             *feature['geometry']['coordinates'][:3])
+            for feature in features]
+    if not rows:
+        return None
+    magnitudes, times, places, longitudes, latitudes, depths = zip(*rows)
+    return {
+        'magnitude': np.array(magnitudes, dtype=float),
+        'time': np.array(times),
+        'place': np.array(places, dtype=object),
+        'longitude': np.array(longitudes, dtype=float),
+        'latitude': np.array(latitudes, dtype=float),
+        'depth': np.array(depths, dtype=float)
+    }
+
+
+def countries_from_places(places):
+    # Държавата е последната част от описанието на мястото; изчислява се веднъж за всяко уникално място
+    countries = places.categories.to_series().str.rpartition(', ')[2]
+    countries = countries.where(countries != '', UNKNOWN_COUNTRY)
+    codes = places.codes
+    return np.where(codes >= 0, countries.to_numpy()[codes], UNKNOWN_COUNTRY)
+
+
+def columns_to_frame(columns):
+    from regions import assign_regions  # shapely и границите от Natural Earth се зареждат при първа употреба
+
+    places = pd.Categorical(columns['place'])
+    # Държава и континент по границите от Natural Earth; за откритото море остава описанието на мястото
+    countries, continents = assign_regions(columns['latitude'], columns['longitude'])
+    countries = np.where(countries != None, countries, countries_from_places(places))  # noqa: E711
+    time = columns['time']
+    if time.dtype == object:
+        time = pd.array(time, dtype='Int64')
+    return pd.DataFrame({
+        'magnitude': columns['magnitude'],
+        'place': places,
+        'time': pd.to_datetime(time, unit='ms').as_unit('ns'),
+        'depth': columns['depth'],
+        'latitude': columns['latitude'],
+        'longitude': columns['longitude'],
+        'country': pd.Categorical(countries),
+        'nearest_city': places,
+        'continent': pd.Categorical(continents, categories=CONTINENTS)
+    })
 
 
 def process_data(data):
-    features = data['features']
-    processed_data = []
+    columns = extract_columns(data['features'])
+    if columns is None:
+        return pd.DataFrame(columns=COLUMNS)
+    return columns_to_frame(columns)
+
+
+def iter_processed_chunks(features, chunk_size=STREAM_CHUNK_SIZE):
+    # Обработка на поток от събития на порции с фиксиран размер
+    batch = []
     for feature in features:
-        properties = feature['properties']
-        coordinates = feature['geometry']['coordinates']
-        latitude = coordinates[1]
-        longitude = coordinates[0]
-        country = properties.get('place', '').split(', ')[-1] if properties.get('place') else 'Неизвестна'
-        processed_data.append({
-            'magnitude': properties['mag'],
-            'place': properties['place'],
-            'time': pd.to_datetime(properties['time'], unit='ms'),
-            'depth': coordinates[2],
-            'latitude': latitude,
-            'longitude': longitude,
-            'country': country,
-            'nearest_city': properties.get('place'),
-            'continent': get_continent(latitude, longitude)
-        })
-    return pd.DataFrame(processed_data)
+        batch.append(feature)
+        if len(batch) == chunk_size:
+            yield columns_to_frame(extract_columns(batch))
+            batch = []
+    if batch:
+        yield columns_to_frame(extract_columns(batch))
+
+
+def concat_chunks(frames):
+    frames = list(frames)
+    if not frames:
+        return pd.DataFrame(columns=COLUMNS)
+    columns = {}
+    for column in COLUMNS:
+        parts = [frame[column] for frame in frames]
+        if isinstance(parts[0].dtype, pd.CategoricalDtype):
+            # Категориите на отделните порции се обединяват, за да не се загуби категорийният тип
+            columns[column] = union_categoricals(parts)
+        else:
+            columns[column] = np.concatenate([part.to_numpy() for part in parts])
+    return pd.DataFrame(columns)
+
+
+def process_stream(features, chunk_size=STREAM_CHUNK_SIZE):
+    return concat_chunks(iter_processed_chunks(features, chunk_size))
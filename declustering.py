@@ -0,0 +1,155 @@
+import bisect
+import math
+
+import numpy as np
+
+from cancellation import check_cancelled
+
+KM_PER_DEGREE = 111  # 111 км е приблизително 1 градус
+SECONDS_PER_DAY = 24 * 60 * 60
+MAX_MAGNITUDE = 10.0  # горна граница за размера на прозорците при предварително неизвестни данни
+CANCEL_CHECK_INTERVAL = 10000  # през колко земетресения се проверява за прекратяване
+
+
+def fixed_window(magnitudes, days=7, distance_km=100):
+    # Еднакъв прозорец за всички главни земетресения (7 дни и 100 км)
+    magnitudes = np.asarray(magnitudes, dtype=float)
+    time_window = np.full(magnitudes.shape, days * SECONDS_PER_DAY, dtype=float)
+    distance = np.full(magnitudes.shape, distance_km / KM_PER_DEGREE, dtype=float)
+    return time_window, distance
+
+
+def gardner_knopoff_window(magnitudes):
+    # Прозорци на Гарднър-Кнопоф (1974), зависещи от магнитуда на главното земетресение
+    magnitudes = np.asarray(magnitudes, dtype=float)
+    distance_km = 10 ** (0.1238 * magnitudes + 0.983)
+    days = np.where(magnitudes >= 6.5,
+                    10 ** (0.032 * magnitudes + 2.7389),
+                    10 ** (0.5409 * magnitudes - 0.547))
+    return days * SECONDS_PER_DAY, distance_km / KM_PER_DEGREE
+
+
+WINDOW_MODELS = {
+    'fixed': fixed_window,
+    'gardner_knopoff': gardner_knopoff_window,
+}
+
+
+class DeclusterIndex:
+    # Пространствена решетка с размер на клетката не по-малък от най-големия радиус,
+    # така че всички възможни главни земетресения са в съседните 3x3 клетки.
+    # Всяка клетка пази времената на главните земетресения сортирани, заедно с техните позиции.
+    def __init__(self, window=fixed_window, cell_size=None, max_time_window=None):
+        self.window = window
+        if cell_size is None or max_time_window is None:
+            time_window, radius = window(np.array([MAX_MAGNITUDE]))
+            cell_size = float(radius[0]) if cell_size is None else cell_size
+            max_time_window = float(time_window[0]) if max_time_window is None else max_time_window
+        self.cell_size = max(cell_size, 1e-9)
+        self.max_time_window = int(math.ceil(max_time_window * 1e9)) + 1
+        self.cells = {}
+        self.time_ns = []
+        self.lat = []
+        self.lon = []
+        self.window_s = []
+        self.window_deg = []
+
+    def __len__(self):
+        return len(self.time_ns)
+
+    def add(self, times, latitudes, longitudes, magnitudes, cancel_event=None):
+        # Земетресенията се обработват в подадения ред (обикновено по низходящ магнитуд).
+        # Връща масив, в който за всяко главно земетресение стойността е собствената му позиция,
+        # а за всеки афтършок - позицията на първото главно земетресение, в чийто прозорец попада.
+        times = np.asarray(times).astype('datetime64[ns]')
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.asarray(longitudes, dtype=float)
+        magnitudes = np.asarray(magnitudes, dtype=float)
+
+        n = len(times)
+        offset = len(self)
+        main_of = np.arange(offset, offset + n, dtype=np.int64)
+        if n == 0:
+            return main_of
+
+        time_window, radius = self.window(magnitudes)
+        time_window = np.broadcast_to(np.asarray(time_window, dtype=float), (n,))
+        radius = np.broadcast_to(np.asarray(radius, dtype=float), (n,))
+
+        valid = (~np.isnat(times) & np.isfinite(latitudes) & np.isfinite(longitudes)
+                 & np.isfinite(time_window) & np.isfinite(radius))
+
+        cell_lat = np.zeros(n, dtype=np.int64)
+        cell_lon = np.zeros(n, dtype=np.int64)
+        cell_lat[valid] = np.floor(latitudes[valid] / self.cell_size).astype(np.int64)
+        cell_lon[valid] = np.floor(longitudes[valid] / self.cell_size).astype(np.int64)
+
+        self.time_ns.extend(times.view(np.int64).tolist())
+        self.lat.extend(latitudes.tolist())
+        self.lon.extend(longitudes.tolist())
+        self.window_s.extend(time_window.tolist())
+        self.window_deg.extend(radius.tolist())
+        time_ns, lat, lon = self.time_ns, self.lat, self.lon
+        window_s, window_deg = self.window_s, self.window_deg
+        cells = self.cells
+        max_time_window = self.max_time_window
+        cell_lat = cell_lat.tolist()
+        cell_lon = cell_lon.tolist()
+        valid = valid.tolist()
+
+        for j in range(n):
+            if j % CANCEL_CHECK_INTERVAL == 0:
+                check_cancelled(cancel_event)
+            if not valid[j]:
+                continue
+
+            i = offset + j
+            t = time_ns[i]
+            quake_lat = lat[i]
+            quake_lon = lon[i]
+            main = -1
+            for d_lat in (-1, 0, 1):
+                for d_lon in (-1, 0, 1):
+                    cell = cells.get((cell_lat[j] + d_lat, cell_lon[j] + d_lon))
+                    if cell is None:
+                        continue
+                    cell_times, cell_ids = cell
+                    lo = bisect.bisect_left(cell_times, t - max_time_window)
+                    hi = bisect.bisect_right(cell_times, t + max_time_window)
+                    for k in range(lo, hi):
+                        m = cell_ids[k]
+                        if main != -1 and m >= main:
+                            continue
+                        time_diff = abs(t - time_ns[m]) / 1e9
+                        distance = ((quake_lat - lat[m]) ** 2 + (quake_lon - lon[m]) ** 2) ** 0.5
+                        if time_diff <= window_s[m] and distance <= window_deg[m]:
+                            main = m
+
+            if main == -1:
+                cell = cells.setdefault((cell_lat[j], cell_lon[j]), ([], []))
+                k = bisect.bisect_right(cell[0], t)
+                cell[0].insert(k, t)
+                cell[1].insert(k, i)
+            else:
+                main_of[j] = main
+
+        return main_of
+
+
+def decluster(times, latitudes, longitudes, magnitudes, window=fixed_window, cancel_event=None):
+    magnitudes = np.asarray(magnitudes, dtype=float)
+    n = len(magnitudes)
+    if n == 0:
+        return np.arange(0, dtype=np.int64)
+
+    # Размерът на решетката и най-големият времеви прозорец се определят от самите данни
+    time_window, radius = window(magnitudes)
+    time_window = np.broadcast_to(np.asarray(time_window, dtype=float), (n,))
+    radius = np.broadcast_to(np.asarray(radius, dtype=float), (n,))
+    usable = np.isfinite(time_window) & np.isfinite(radius)
+    if not usable.any():
+        return np.arange(n, dtype=np.int64)
+
+    index = DeclusterIndex(window, cell_size=float(radius[usable].max()),
+                           max_time_window=float(time_window[usable].max()))
+    return index.add(times, latitudes, longitudes, magnitudes, cancel_event)
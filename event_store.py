@@ -0,0 +1,194 @@
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+from datetime import datetime, timedelta, timezone
+
+from data_fetcher import USGS_BASE_URL, stream_earthquake_data
+
+DEFAULT_STORE_PATH = os.path.join(os.path.expanduser('~'), '.earthquake_analyzer', 'events.sqlite')
+REFRESH_INTERVAL = timedelta(minutes=10)  # След колко време се проверява за обновени събития
+SAVE_BATCH_SIZE = 5000  # Брой събития, записвани в една транзакция при поточно изтегляне
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id TEXT PRIMARY KEY,
+    time INTEGER NOT NULL,
+    updated INTEGER NOT NULL,
+    magnitude REAL,
+    feature TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_time ON events (time);
+CREATE TABLE IF NOT EXISTS coverage (
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL,
+    min_magnitude REAL NOT NULL,
+    fetched_at INTEGER NOT NULL
+);
+"""
+
+
+def _to_milliseconds(value):
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(str(value))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1000)
+
+
+def _from_milliseconds(value):
+    # Наивно време в UTC, както го очаква data_fetcher
+    return datetime.fromtimestamp(value / 1000, tz=timezone.utc).replace(tzinfo=None)
+
+
+def _now_milliseconds():
+    return int(time.time() * 1000)
+
+
+def covered_segments(spans, start, end):
+    # Разделяне на [start, end] на елементарни интервали; за всеки покрит интервал се връща
+    # най-новото време на изтегляне сред покриващите го периоди
+    bounds = {start, end}
+    for span_start, span_end, _ in spans:
+        bounds.update(b for b in (span_start, span_end) if start < b < end)
+    bounds = sorted(bounds)
+
+    segments = []
+    for segment_start, segment_end in zip(bounds[:-1], bounds[1:]):
+        fetched = [fetched_at for span_start, span_end, fetched_at in spans
+                   if span_start <= segment_start and segment_end <= span_end]
+        segments.append((segment_start, segment_end, max(fetched) if fetched else None))
+    return segments
+
+
+def missing_ranges(spans, start, end):
+    gaps = []
+    for segment_start, segment_end, fetched_at in covered_segments(spans, start, end):
+        if fetched_at is not None:
+            continue
+        if gaps and gaps[-1][1] == segment_start:
+            gaps[-1] = (gaps[-1][0], segment_end)
+        else:
+            gaps.append((segment_start, segment_end))
+    return gaps
+
+
+class EventStore:
+    def __init__(self, path=DEFAULT_STORE_PATH, base_url=USGS_BASE_URL, refresh_interval=REFRESH_INTERVAL):
+        self.path = path
+        self.base_url = base_url
+        self.refresh_interval = refresh_interval
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as connection:
+            connection.executescript(SCHEMA)
+
+    def _connect(self):
+        # Нова връзка за всяка операция, за да може хранилището да се ползва от различни нишки
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute('PRAGMA journal_mode=WAL')
+        return connection
+
+    def _spans(self, connection, start, end, min_magnitude):
+        # Период, изтеглен с по-нисък минимален магнитуд, покрива и по-високите
+        return connection.execute(
+            "SELECT start, end, fetched_at FROM coverage "
+            "WHERE min_magnitude <= ? AND start < ? AND end > ?",
+            (min_magnitude, end, start)).fetchall()
+
+    def _save(self, connection, features):
+        rows = []
+        for feature in features:
+            properties = feature['properties']
+            rows.append((feature['id'], properties.get('time') or 0,
+                         properties.get('updated') or properties.get('time') or 0,
+                         properties.get('mag'), json.dumps(feature, ensure_ascii=False)))
+        connection.executemany(
+            "INSERT INTO events (id, time, updated, magnitude, feature) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET time = excluded.time, updated = excluded.updated, "
+            "magnitude = excluded.magnitude, feature = excluded.feature "
+            "WHERE excluded.updated >= events.updated",
+            rows)
+
+    def _record_coverage(self, connection, start, end, min_magnitude, fetched_at):
+        # Премахване на периоди, които новият изцяло замества
+        connection.execute(
+            "DELETE FROM coverage WHERE start >= ? AND end <= ? AND min_magnitude >= ? AND fetched_at <= ?",
+            (start, end, min_magnitude, fetched_at))
+        connection.execute("INSERT INTO coverage (start, end, min_magnitude, fetched_at) VALUES (?, ?, ?, ?)",
+                           (start, end, min_magnitude, fetched_at))
+
+    def _save_stream(self, features):
+        # Записване на порции, за да не се държи целият отговор в паметта
+        count = 0
+        batch = []
+        with closing(self._connect()) as connection:
+            for feature in features:
+                batch.append(feature)
+                if len(batch) == SAVE_BATCH_SIZE:
+                    with connection:
+                        self._save(connection, batch)
+                    count += len(batch)
+                    batch = []
+            with connection:
+                self._save(connection, batch)
+        return count + len(batch)
+
+    def sync(self, start_date, end_date, min_magnitude, cancel_event=None):
+        start = _to_milliseconds(start_date)
+        end = _to_milliseconds(end_date)
+        now = _now_milliseconds()
+        stats = {"fetched": 0, "updated": 0, "gaps": 0, "bytes": 0}
+
+        with closing(self._connect()) as connection:
+            spans = self._spans(connection, start, end, min_magnitude)
+
+        gaps = missing_ranges(spans, start, end)
+        covered = [fetched_at for _, _, fetched_at in covered_segments(spans, start, end) if fetched_at is not None]
+
+        # Изтегляне само на липсващите периоди; периодът се отбелязва като покрит едва след като е записан изцяло
+        for gap_start, gap_end in gaps:
+            download = {}
+            stats["fetched"] += self._save_stream(stream_earthquake_data(
+                _from_milliseconds(gap_start), _from_milliseconds(gap_end), min_magnitude, base_url=self.base_url,
+                cancel_event=cancel_event, stats=download))
+            with closing(self._connect()) as connection, connection:
+                self._record_coverage(connection, gap_start, gap_end, min_magnitude, now)
+            stats["bytes"] += download["bytes"]
+        stats["gaps"] = len(gaps)
+
+        # Събития от вече наличните периоди, обновени след последното им изтегляне
+        oldest = min(covered) if covered else None
+        if oldest is not None and now - oldest >= self.refresh_interval / timedelta(milliseconds=1):
+            download = {}
+            stats["updated"] = self._save_stream(stream_earthquake_data(
+                _from_milliseconds(start), _from_milliseconds(end), min_magnitude, base_url=self.base_url,
+                updated_after=_from_milliseconds(oldest), cancel_event=cancel_event, stats=download))
+            with closing(self._connect()) as connection, connection:
+                self._record_coverage(connection, start, end, min_magnitude, now)
+            stats["bytes"] += download["bytes"]
+
+        return stats
+
+    def iter_load(self, start_date, end_date, min_magnitude):
+        # Събитията се декодират едно по едно, докато се четат от базата
+        start = _to_milliseconds(start_date)
+        end = _to_milliseconds(end_date)
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                "SELECT feature FROM events WHERE time >= ? AND time <= ? AND magnitude >= ? ORDER BY time DESC",
+                (start, end, min_magnitude))
+            for feature, in rows:
+                yield json.loads(feature)
+
+    def load(self, start_date, end_date, min_magnitude):
+        return list(self.iter_load(start_date, end_date, min_magnitude))
+
+    def query(self, start_date, end_date, min_magnitude, cancel_event=None):
+        started = time.perf_counter()
+        stats = self.sync(start_date, end_date, min_magnitude, cancel_event)
+        features = self.load(start_date, end_date, min_magnitude)
+        metadata = dict(stats, count=len(features), seconds=time.perf_counter() - started)
+        return {"type": "FeatureCollection", "metadata": metadata, "features": features}
@@ -0,0 +1,148 @@
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from data_processor import COLUMNS
+from utils import CONTINENTS
+
+MAGNITUDE_SCALE = 100  # магнитудът се пази като int16 с точност 0.01
+MISSING_MAGNITUDE = np.iinfo(np.int16).min
+
+# 31 байта на събитие; мястото, държавата и континентът са кодове в речници
+EVENT_DTYPE = np.dtype([
+    ('time', '<i8'),  # милисекунди от 1970-01-01 (UTC)
+    ('latitude', '<f4'),
+    ('longitude', '<f4'),
+    ('depth', '<f4'),
+    ('magnitude', '<i2'),
+    ('place', '<i4'),
+    ('country', '<i4'),
+    ('continent', '<i1'),
+])
+
+RECORDS_FILE = 'events.npy'
+DICTIONARIES_FILE = 'dictionaries.json'
+
+
+def _codes(values, categories=None):
+    # Кодиране по речник; непознатите и липсващите стойности получават код -1
+    categorical = pd.Categorical(values, categories=categories)
+    return categorical.codes, list(categorical.categories)
+
+
+def _to_milliseconds(value):
+    return np.datetime64(pd.Timestamp(value).tz_localize(None), 'ms').astype(np.int64)
+
+
+class EventTable:
+    # Компактна таблица със събития върху структуриран NumPy масив (може да е отворен с memmap от диска)
+    def __init__(self, records, places, countries):
+        self.records = records
+        self.places = np.asarray(places, dtype=object)
+        self.countries = np.asarray(countries, dtype=object)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def nbytes(self):
+        return self.records.nbytes
+
+    def column(self, name):
+        # Колоните се декодират при поискване; числовите са изгледи без копиране, освен магнитуда
+        records = self.records
+        if name == 'time':
+            return records['time'].view('datetime64[ms]')
+        if name == 'magnitude':
+            magnitudes = records['magnitude']
+            return np.where(magnitudes == MISSING_MAGNITUDE, np.nan, magnitudes / MAGNITUDE_SCALE)
+        if name in ('place', 'nearest_city'):
+            return pd.Categorical.from_codes(records['place'], categories=self.places)
+        if name == 'country':
+            return pd.Categorical.from_codes(records['country'], categories=self.countries)
+        if name == 'continent':
+            return pd.Categorical.from_codes(records['continent'], categories=CONTINENTS)
+        return records[name]
+
+    def to_frame(self, columns=COLUMNS):
+        frame = {}
+        for name in columns:
+            values = self.column(name)
+            if name == 'time':
+                values = values.astype('datetime64[ns]')
+            elif name in ('latitude', 'longitude', 'depth'):
+                values = values.astype(float)
+            frame[name] = values
+        return pd.DataFrame(frame, columns=list(columns))
+
+    def take(self, selection):
+        return EventTable(self.records[selection], self.places, self.countries)
+
+    def select(self, start_date, end_date, min_magnitude):
+        # Филтриране директно върху целочислените колони, без декодиране
+        records = self.records
+        mask = ((records['time'] >= _to_milliseconds(start_date)) & (records['time'] <= _to_milliseconds(end_date))
+                & (records['magnitude'] >= round(min_magnitude * MAGNITUDE_SCALE))
+                & (records['magnitude'] != MISSING_MAGNITUDE))
+        return self.take(mask)
+
+
+def from_frame(df):
+    records = np.zeros(len(df), dtype=EVENT_DTYPE)
+    records['time'] = df['time'].to_numpy(dtype='datetime64[ms]').view(np.int64)
+    records['latitude'] = df['latitude'].to_numpy(dtype=float)
+    records['longitude'] = df['longitude'].to_numpy(dtype=float)
+    records['depth'] = df['depth'].to_numpy(dtype=float)
+    magnitudes = df['magnitude'].to_numpy(dtype=float)
+    records['magnitude'] = np.where(np.isfinite(magnitudes), np.round(np.nan_to_num(magnitudes) * MAGNITUDE_SCALE),
+                                    MISSING_MAGNITUDE)
+    records['place'], places = _codes(df['place'])
+    records['country'], countries = _codes(df['country'])
+    records['continent'], _ = _codes(df['continent'], CONTINENTS)
+    return EventTable(records, places, countries)
+
+
+def save_table(table, path):
+    # Директория с масива на събитията (.npy) и речниците (JSON)
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, RECORDS_FILE), np.ascontiguousarray(table.records))
+    with open(os.path.join(path, DICTIONARIES_FILE), 'w', encoding='utf-8') as f:
+        json.dump({'places': list(table.places), 'countries': list(table.countries)}, f, ensure_ascii=False)
+
+
+def load_table(path, mmap=True):
+    # При mmap=True събитията не се четат в паметта, а се достъпват директно от файла
+    records = np.load(os.path.join(path, RECORDS_FILE), mmap_mode='r' if mmap else None)
+    with open(os.path.join(path, DICTIONARIES_FILE), encoding='utf-8') as f:
+        dictionaries = json.load(f)
+    return EventTable(records, dictionaries['places'], dictionaries['countries'])
+
+
+def as_frame(data, columns=COLUMNS):
+    # Функциите за анализ приемат както DataFrame, така и EventTable
+    if isinstance(data, EventTable):
+        return data.to_frame(columns)
+    return data
+
+
+def main(argv=None):
+    from data_processor import process_stream
+    from json_stream import read_features
+
+    parser = argparse.ArgumentParser(description='Преобразуване на GeoJSON каталог в компактна таблица')
+    parser.add_argument('geojson', help='GeoJSON файл със събития')
+    parser.add_argument('output', help='директория за таблицата')
+    args = parser.parse_args(argv)
+
+    table = from_frame(process_stream(read_features(args.geojson)))
+    save_table(table, args.output)
+    print(f"Записани {len(table)} събития ({table.nbytes / 1e6:.1f} MB)", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,12 +1,52 @@
+import io
+import threading
+import time
 import wx
 from datetime import datetime, timedelta
-from data_fetcher import fetch_earthquake_data
-from data_processor import process_data
-from analyzer import analyze_and_visualize, depth_magnitude_correlation
+from cancellation import AnalysisCancelled, check_cancelled
+from event_store import EventStore
+from instrumentation import Trace
+from rendering import shutdown_render_pool
+from result_cache import DEFAULT_CACHE_DIR, ResultCache, data_fingerprint, result_key
+from warmup import start_prewarm
+
+# pandas, matplotlib и Cartopy се зареждат при първа употреба (или предварително във фонов режим),
+# за да се появи прозорецът веднага
+
+LIVE_FEED = 'all_day'
+LIVE_LIST_SIZE = 100  # брой последни събития в списъка на живо
+
+
+# Етапи на анализа и текстът, показван по време на всеки от тях
+STAGES = [
+    ('fetching', 'Изтегляне на данните...'),
+    ('loading', 'Четене на данните...'),
+    ('parsing', 'Обработка на данните...'),
+    ('statistics', 'Статистики...'),
+    ('declustering', 'Анализ на афтършокове...'),
+    ('rendering', 'Изчертаване на диаграмите...'),
+]
+STAGE_INDEX = {stage: i for i, (stage, _) in enumerate(STAGES)}
+
+# Диаграмите, които се показват след анализа; времето за изчертаване на всяка се записва като отделен етап
+CHARTS = [
+    ('earthquakes_over_time', 'Земетресения във времето'),
+    ('magnitude_distribution', 'Разпределение на магнитудите'),
+    ('world_map', 'Карта на света със земетресения'),
+    ('seismicity_rates', 'Скорост на сеизмичност и b-стойност'),
+]
+STAGE_LABELS = dict({stage: label.rstrip('.') for stage, label in STAGES},
+                    **{name: f"  {title}" for name, title in CHARTS})
+
+
+def valid_results(results):
+    # Резултатите от analyze_and_visualize: девет стойности, сред които речникът с всички диаграми
+    return (isinstance(results, tuple) and len(results) == 9 and isinstance(results[7], dict)
+            and all(name in results[7] for name, _ in CHARTS))
 
 
 class ResultDialog(wx.Dialog):
-    def __init__(self, parent, title, message, statistics):
+    def __init__(self, parent, title, message, statistics, timings):
         super().__init__(parent, title=title, size=(500, 500))
 
         panel = wx.Panel(self)
@@ -23,7 +63,11 @@ class ResultDialog(wx.Dialog):
 
         btn_stats = wx.Button(panel, label="Статистика")
         btn_stats.Bind(wx.EVT_BUTTON, lambda event: self.on_statistics(event, statistics))
-        hbox.Add(btn_stats, proportion=1, flag=wx.EXPAND | wx.LEFT, border=5)
+        hbox.Add(btn_stats, proportion=1, flag=wx.EXPAND | wx.LEFT | wx.RIGHT, border=5)
+
+        btn_timings = wx.Button(panel, label="Времена")
+        btn_timings.Bind(wx.EVT_BUTTON, lambda event: self.on_timings(event, timings))
+        hbox.Add(btn_timings, proportion=1, flag=wx.EXPAND | wx.LEFT, border=5)
 
         vbox.Add(hbox, flag=wx.ALIGN_CENTER | wx.BOTTOM, border=10)
 
@@ -37,9 +81,14 @@ class ResultDialog(wx.Dialog):
         dlg.ShowModal()
         dlg.Destroy()
 
+    def on_timings(self, event, timings):
+        dlg = wx.MessageDialog(self, timings, "Времена по етапи", wx.OK | wx.ICON_INFORMATION)
+        dlg.ShowModal()
+        dlg.Destroy()
+
 
 class SeismicAnalysisApp(wx.Frame):
-    def __init__(self):
+    def __init__(self, prewarm=True):
         super().__init__(parent=None, title='Анализ на сеизмична активност')
         panel = wx.Panel(self)
 
@@ -59,8 +108,26 @@ class SeismicAnalysisApp(wx.Frame):
                                               'Южна Америка'],
                                      style=wx.CB_READONLY)
 
-        analyze_button = wx.Button(panel, label='Анализирай', pos=(10, 210), size=(150, 25))
-        analyze_button.Bind(wx.EVT_BUTTON, self.on_analyze)
+        self.analyze_button = wx.Button(panel, label='Анализирай', pos=(10, 210), size=(150, 25))
+        self.analyze_button.Bind(wx.EVT_BUTTON, self.on_analyze)
+
+        self.cancel_button = wx.Button(panel, label='Отказ', pos=(170, 210), size=(100, 25))
+        self.cancel_button.Bind(wx.EVT_BUTTON, self.on_cancel)
+        self.cancel_button.Disable()
+
+        # Напредък на анализа по етапи
+        self.progress = wx.Gauge(panel, range=len(STAGES), pos=(10, 245), size=(260, 15))
+        self.status = wx.StaticText(panel, label="", pos=(10, 265), size=(260, 20))
+        self.cancel_event = None
+
+        # Следене на потока на USGS в реално време
+        self.live_button = wx.ToggleButton(panel, label='На живо', pos=(10, 290), size=(150, 25))
+        self.live_button.Bind(wx.EVT_TOGGLEBUTTON, self.on_live)
+        self.live_status = wx.StaticText(panel, label="", pos=(10, 320), size=(260, 20))
+        self.live_events = wx.ListBox(panel, pos=(10, 340), size=(260, 150))
+        self.live_stop = None
+        self.live_poller = None
+        self.live_generation = 0  # номер на текущата нишка на живо; закъснелите промени от предишни се пренебрегват
 
         # Стойности по подразбиране
         today = datetime.now()
@@ -70,10 +137,23 @@ class SeismicAnalysisApp(wx.Frame):
         self.magnitude.SetValue("5.0")
         self.continent.SetValue('Всички')
 
-        self.SetSize((300, 300))
+        # Локален каталог - изтеглят се само липсващите периоди
+        self.event_store = EventStore()
+        # Готови резултати по отпечатък на данните и параметрите; последната обработена таблица се пази отделно,
+        # за да е мигновена смяната на континента върху същите данни
+        self.result_cache = ResultCache(disk_dir=DEFAULT_CACHE_DIR)
+        self.last_frame = (None, None)
+        self.last_query = (None, None, 0.0)  # (период и магнитуд, отпечатък, момент на заявката)
+
+        self.Bind(wx.EVT_CLOSE, self.on_close)
+
+        self.SetSize((300, 540))
         self.Centre()
         self.Show()
 
+        if prewarm:
+            start_prewarm()
+
     def on_analyze(self, event):
         # Валидация на входните данни
         try:
@@ -89,21 +169,140 @@ class SeismicAnalysisApp(wx.Frame):
             wx.MessageBox(str(e), "Грешка", wx.OK | wx.ICON_ERROR)
             return
 
-        # Извличане и обработка на данните
-        data = fetch_earthquake_data(start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"), magnitude)
-        df = process_data(data)
+        # Анализът се изпълнява във фонова нишка, за да не блокира прозореца
+        self.cancel_event = threading.Event()
+        self.analyze_button.Disable()
+        self.cancel_button.Enable()
+        worker = threading.Thread(target=self.run_analysis,
+                                  args=(start_date, end_date, magnitude, continent, self.cancel_event),
+                                  daemon=True)
+        worker.start()
+
+    def on_close(self, event):
+        # Прекратяване на текущия анализ и следенето на живо и спиране на процесите за диаграми
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+        self.stop_live()
+        shutdown_render_pool(wait=False)
+        event.Skip()
+
+    def on_cancel(self, event):
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+            self.status.SetLabel("Прекратяване...")
+
+    def report_progress(self, stage, cancel_event, trace=None, **details):
+        check_cancelled(cancel_event)
+        if trace is not None:
+            trace.start(stage, **details)
+        wx.CallAfter(self.progress.SetValue, STAGE_INDEX[stage])
+        wx.CallAfter(self.status.SetLabel, dict(STAGES)[stage])
+
+    def run_analysis(self, start_date, end_date, magnitude, continent, cancel_event):
+        # Време, брой събития, изтеглени байтове и памет за всеки етап
+        trace = Trace(f"{start_date:%Y-%m-%d}_{end_date:%Y-%m-%d}_M{magnitude}_{continent.replace(' ', '_')}")
+        try:
+            # Извличане и обработка на данните
+            self.report_progress('fetching', cancel_event, trace)
+            query = (start_date, end_date, magnitude)
+            data = None
+            fingerprint = self.recent_fingerprint(query)
+            if fingerprint is None:
+                data = self.query_store(query, cancel_event, trace)
+                fingerprint = data_fingerprint(data['features'])
+                self.last_query = (query, fingerprint, time.monotonic())
+
+            key = result_key(fingerprint, start_date, end_date, magnitude, continent)
+            results = self.result_cache.get(key, valid=valid_results)
+            # Данните се четат от хранилището само ако последната обработена таблица е за други данни
+            if results is None and data is None and self.last_frame[0] != fingerprint:
+                data = self.query_store(query, cancel_event, trace)
+                fingerprint = data_fingerprint(data['features'])
+                self.last_query = (query, fingerprint, time.monotonic())
+                key = result_key(fingerprint, start_date, end_date, magnitude, continent)
+                results = self.result_cache.get(key, valid=valid_results)
+            trace.annotate(cache_hit=results is not None)
+            if results is None:
+                self.report_progress('parsing', cancel_event, trace)
+                df = self.processed_frame(fingerprint, data)
+
+                # Филтриране по континент
+                if continent != 'Всички':
+                    df = df[df['continent'] == continent]
+                trace.annotate(events=len(df))
+
+                # Анализ и визуализация
+                from analyzer import analyze_and_visualize
+
+                timings = {}
+                results = analyze_and_visualize(df, start_date, end_date, magnitude,
+                                                progress=lambda stage: self.report_progress(stage, cancel_event, trace,
+                                                                                            events=len(df)),
+                                                cancel_event=cancel_event, timings=timings)
+                check_cancelled(cancel_event)
+                trace.stop()
+                for name, _ in CHARTS:
+                    trace.record(name, timings[name])
+                self.result_cache.put(key, results)
+        except AnalysisCancelled:
+            self.finish_trace(trace)
+            wx.CallAfter(self.finish_analysis, "Анализът е прекратен")
+            return
+        except Exception as e:
+            self.finish_trace(trace)
+            wx.CallAfter(self.finish_analysis, "")
+            wx.CallAfter(wx.MessageBox, f"Грешка при анализа: {e}", "Грешка", wx.OK | wx.ICON_ERROR)
+            return
 
-        # Филтриране по континент
-        if continent != 'Всички':
-            df = df[df['continent'] == continent]
+        self.finish_trace(trace)
+        wx.CallAfter(self.finish_analysis, "")
+        wx.CallAfter(self.show_results, start_date, end_date, magnitude, continent, results, trace)
 
-        # Анализ и визуализация
+    def finish_trace(self, trace):
+        trace.finish()
+        try:
+            trace.write()
+        except OSError:
+            pass
+
+    def recent_fingerprint(self, query):
+        # Отпечатъкът на последната заявка е валиден, докато хранилището не би проверило за обновления
+        last_query, fingerprint, queried_at = self.last_query
+        if last_query == query and time.monotonic() - queried_at < self.event_store.refresh_interval.total_seconds():
+            return fingerprint
+        return None
+
+    def query_store(self, query, cancel_event, trace):
+        # Изтеглянето на липсващите периоди и четенето от хранилището се измерват поотделно
+        stats = self.event_store.sync(*query, cancel_event=cancel_event)
+        trace.annotate(bytes=stats['bytes'], downloaded=stats['fetched'] + stats['updated'])
+        self.report_progress('loading', cancel_event, trace)
+        features = self.event_store.load(*query)
+        trace.annotate(events=len(features))
+        return {"type": "FeatureCollection", "metadata": stats, "features": features}
+
+    def processed_frame(self, fingerprint, data):
+        last_fingerprint, df = self.last_frame
+        if last_fingerprint != fingerprint:
+            from data_processor import process_data
+
+            df = process_data(data)
+            self.last_frame = (fingerprint, df)
+        return df
+
+    def finish_analysis(self, status):
+        self.progress.SetValue(0)
+        self.status.SetLabel(status)
+        self.cancel_button.Disable()
+        self.analyze_button.Enable()
+
+    def show_results(self, start_date, end_date, magnitude, continent, results, trace):
         (result, top_earthquakes, most_affected_region, affected_region_count, correlation,
-         seismic_hazard_assessment, aftershocks_analysis, map_image, activity_change_analysis) = analyze_and_visualize(
-            df, start_date, end_date,
-            magnitude)
+         seismic_hazard_assessment, aftershocks_analysis, images, activity_change_analysis) = results
 
         # Корелация
+        from utils import depth_magnitude_correlation
+
         correlation_explanation = depth_magnitude_correlation(correlation)
 
         # Резултати
@@ -121,11 +320,78 @@ class SeismicAnalysisApp(wx.Frame):
                       f"{seismic_hazard_assessment}\n"
                       f"Земетресения с най-висок магнитуд:\n{top_earthquakes}")
 
-        dlg = ResultDialog(self, "Резултати от анализа", message, statistics)
+        dlg = ResultDialog(self, "Резултати от анализа", message, statistics, trace.summary(STAGE_LABELS))
         if dlg.ShowModal() == wx.ID_OK:
-            self.show_images()
+            self.show_images(images)
         dlg.Destroy()
 
+    def on_live(self, event):
+        if not self.live_button.GetValue():
+            self.stop_live()
+            return
+
+        try:
+            magnitude = self.validate_magnitude(self.magnitude.GetValue())
+        except ValueError as e:
+            self.live_button.SetValue(False)
+            wx.MessageBox(str(e), "Грешка", wx.OK | wx.ICON_ERROR)
+            return
+
+        # Допитването до потока е във фонова нишка; промените се предават на прозореца чрез wx.CallAfter
+        self.live_stop = threading.Event()
+        self.live_generation += 1
+        generation = self.live_generation
+        from live_feed import FeedPoller, LiveCatalog, feed_url, run_live
+
+        self.live_poller = FeedPoller(feed_url(LIVE_FEED), min_magnitude=magnitude)
+        self.live_events.Clear()
+        self.live_status.SetLabel("Свързване...")
+        worker = threading.Thread(target=run_live,
+                                  args=(self.live_poller, LiveCatalog(),
+                                        lambda update: wx.CallAfter(self.show_live_update, update, generation)),
+                                  kwargs={'stop_event': self.live_stop,
+                                          'on_error': lambda e: wx.CallAfter(self.show_live_error, e, generation)},
+                                  daemon=True)
+        worker.start()
+
+    def stop_live(self):
+        if self.live_stop is not None:
+            self.live_stop.set()
+            self.live_stop = None
+        if self.live_poller is not None:
+            self.live_poller.close()
+            self.live_poller = None
+        self.live_status.SetLabel("")
+
+    def is_live(self, generation):
+        return self.live_stop is not None and generation == self.live_generation
+
+    def show_live_error(self, error, generation):
+        if self.is_live(generation):
+            self.live_status.SetLabel(f"Грешка: {error}")
+
+    def show_live_update(self, update, generation):
+        if not self.is_live(generation):
+            return
+        continent = self.continent.GetValue()
+        new = update['new']
+        if continent != 'Всички':
+            new = new[new['continent'] == continent]
+        for _, event in new.sort_values('time').iterrows():
+            self.live_events.Insert(f"{event['time']:%H:%M} M{event['magnitude']:.1f} {event['place']}", 0)
+        while self.live_events.GetCount() > LIVE_LIST_SIZE:
+            self.live_events.Delete(self.live_events.GetCount() - 1)
+
+        # Закъснението се измерва в момента на обновяване на прозореца
+        from live_feed import feed_latency
+
+        latency = feed_latency(update['generated'])
+        statistics = update['statistics']
+        self.live_status.SetLabel(f"Нови: {len(update['new'])}, обновени: {len(update['updated'])}, "
+                                  f"общо: {statistics['events']}, ср. M{statistics['mean_magnitude']:.1f}"
+                                  + (f", закъснение: {latency:.0f} с" if latency is not None else ""))
+        self.live_status.SetToolTip(statistics['top_earthquakes'])
+
     def validate_date(self, date_string, field_name):
         try:
             return datetime.strptime(date_string, "%Y-%m-%d")
@@ -141,22 +407,13 @@ class SeismicAnalysisApp(wx.Frame):
         except ValueError:
             raise ValueError("Магнитудът трябва да бъде число между 0.0 и 10.0")
 
-    def show_images(self):
-        image1 = wx.Image('earthquakes_over_time.png', wx.BITMAP_TYPE_PNG)
-        image2 = wx.Image('magnitude_distribution.png', wx.BITMAP_TYPE_PNG)
-        image4 = wx.Image('world_map.png', wx.BITMAP_TYPE_PNG)
-
-        frame1 = wx.Frame(None, -1, 'Земетресения във времето')
-        wx.StaticBitmap(frame1, -1, wx.Bitmap(image1))
-        frame1.Show()
-
-        frame2 = wx.Frame(None, -1, 'Разпределение на магнитудите')
-        wx.StaticBitmap(frame2, -1, wx.Bitmap(image2))
-        frame2.Show()
-
-        frame4 = wx.Frame(None, -1, 'Карта на света със земетресения')
-        wx.StaticBitmap(frame4, -1, wx.Bitmap(image4))
-        frame4.Show()
+    def show_images(self, images):
+        # Изображенията идват като PNG в паметта, без междинни файлове
+        for name, title in CHARTS:
+            image = wx.Image(io.BytesIO(images[name]), wx.BITMAP_TYPE_PNG)
+            frame = wx.Frame(None, -1, title)
+            wx.StaticBitmap(frame, -1, wx.Bitmap(image))
+            frame.Show()
 
 
 if __name__ == '__main__':
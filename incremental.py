@@ -0,0 +1,286 @@
+import heapq
+import itertools
+import math
+from collections import Counter
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from analyzer import format_activity_change
+from declustering import DeclusterIndex, fixed_window
+
+NS_PER_DAY = 24 * 60 * 60 * 10 ** 9
+MAGNITUDE_BIN = 100  # броячите по време се водят за магнитуди с точност 0.01
+
+
+class IncrementalAnalysis:
+    # Състояние на анализа, което се обновява с всяка нова порция събития за време,
+    # пропорционално на порцията, а не на целия каталог.
+    # Събитията се разпознават по индекса на таблицата (идентификатора от USGS): повторно подадено събитие
+    # замества предишната си версия, а remove() премахва събития (напр. излезли от прозореца на живо)
+    def __init__(self, top_count=3, window=fixed_window):
+        self.top_count = top_count
+        self.window = window
+        # идентификатор -> (дълбочина, магнитуд, време в ns, ширина, дължина, държава, град, място)
+        self.events = {}
+
+        # Текущи моменти (Уелфорд/Чан) за дълбочина и магнитуд
+        self.count = 0
+        self.mean_depth = 0.0
+        self.mean_magnitude = 0.0
+        self.m2_depth = 0.0
+        self.m2_magnitude = 0.0
+        self.co_moment = 0.0
+
+        # Най-силните земетресения (минимална купчина с размер top_count); при премахване на събитие
+        # от нея се построява наново при следващото четене
+        self._top = []
+        self._sequence = itertools.count()
+        self._top_stale = False
+
+        # Брой събития по (ден, магнитуд x 100) за промяната в активността
+        self.buckets = Counter()
+        self.country_counts = Counter()
+
+        self._reset_clusters()
+
+    def _reset_clusters(self):
+        # Декластеризация с добавяне; премахването на главно земетресение изисква ново изчисление
+        self.clusters = DeclusterIndex(self.window)
+        self.cluster_ids = []  # позиция в индекса -> идентификатор
+        self.main_of = {}  # идентификатор -> позиция на главното му земетресение
+        self.aftershock_counts = Counter()
+        self.main_quakes = {}
+        self._clusters_stale = False
+
+    def update(self, df):
+        if len(df) == 0:
+            return self
+        df = df[~df.index.duplicated(keep='last')]
+        self.remove([event_id for event_id in df.index if event_id in self.events])
+
+        depth = df['depth'].to_numpy(dtype=float)
+        magnitude = df['magnitude'].to_numpy(dtype=float)
+        times = df['time'].to_numpy(dtype='datetime64[ns]')
+        latitude = df['latitude'].to_numpy(dtype=float)
+        longitude = df['longitude'].to_numpy(dtype=float)
+        countries = df['country'].astype(object).to_numpy()
+        cities = df['nearest_city'].astype(object).to_numpy()
+        places = df['place'].astype(object).to_numpy()
+        ids = df.index.to_list()
+        self.events.update(zip(ids, zip(depth.tolist(), magnitude.tolist(), times.view(np.int64).tolist(),
+                                        latitude.tolist(), longitude.tolist(), countries, cities, places)))
+
+        self._update_moments(depth, magnitude)
+        self._update_top(ids, magnitude, cities)
+        self._update_buckets(times, magnitude, 1)
+        self.country_counts.update(country for country in countries if pd.notna(country))
+        if not self._clusters_stale:
+            self._index(ids, times, latitude, longitude, magnitude, places)
+        return self
+
+    def remove(self, ids):
+        # Изваждане на събитията (или на предишните им версии) от натрупаното състояние
+        removed = [(event_id, self.events.pop(event_id)) for event_id in ids if event_id in self.events]
+        if not removed:
+            return self
+        removed_ids, records = zip(*removed)
+        depth, magnitude, times, _, _, countries, _, _ = zip(*records)
+        magnitude = np.array(magnitude, dtype=float)
+
+        self._remove_moments(np.array(depth, dtype=float), magnitude)
+        if any(item[2] in removed_ids for item in self._top):
+            self._top_stale = True
+        self._update_buckets(np.array(times, dtype=np.int64).view('datetime64[ns]'), magnitude, -1)
+        self.country_counts.subtract(country for country in countries if pd.notna(country))
+        self.country_counts = +self.country_counts
+
+        for event_id in removed_ids:
+            main = self.main_of.pop(event_id, None)
+            if main is None:
+                continue
+            if self.cluster_ids[main] == event_id:
+                self._clusters_stale = True
+            else:
+                self.aftershock_counts[main] -= 1
+                if self.aftershock_counts[main] == 0:
+                    del self.aftershock_counts[main]
+        return self
+
+    @staticmethod
+    def _moments(depth, magnitude):
+        valid = np.isfinite(depth) & np.isfinite(magnitude)
+        depth = depth[valid]
+        magnitude = magnitude[valid]
+        if len(depth) == 0:
+            return None
+        mean_d = depth.mean()
+        mean_m = magnitude.mean()
+        return (len(depth), mean_d, mean_m, float(((depth - mean_d) ** 2).sum()),
+                float(((magnitude - mean_m) ** 2).sum()), float(((depth - mean_d) * (magnitude - mean_m)).sum()))
+
+    def _update_moments(self, depth, magnitude):
+        moments = self._moments(depth, magnitude)
+        if moments is None:
+            return
+        n_b, mean_d, mean_m, m2_d, m2_m, co = moments
+
+        # Обединяване на моментите на порцията с натрупаните до момента
+        n_a = self.count
+        n = n_a + n_b
+        delta_d = mean_d - self.mean_depth
+        delta_m = mean_m - self.mean_magnitude
+        self.mean_depth += delta_d * n_b / n
+        self.mean_magnitude += delta_m * n_b / n
+        self.m2_depth += m2_d + delta_d ** 2 * n_a * n_b / n
+        self.m2_magnitude += m2_m + delta_m ** 2 * n_a * n_b / n
+        self.co_moment += co + delta_d * delta_m * n_a * n_b / n
+        self.count = n
+
+    def _remove_moments(self, depth, magnitude):
+        moments = self._moments(depth, magnitude)
+        if moments is None:
+            return
+        n_b, mean_d, mean_m, m2_d, m2_m, co = moments
+
+        # Обратното на обединяването: моментите на останалите събития
+        n = self.count
+        n_a = n - n_b
+        if n_a <= 0:
+            self.count = 0
+            self.mean_depth = self.mean_magnitude = 0.0
+            self.m2_depth = self.m2_magnitude = self.co_moment = 0.0
+            return
+        mean_a_d = (n * self.mean_depth - n_b * mean_d) / n_a
+        mean_a_m = (n * self.mean_magnitude - n_b * mean_m) / n_a
+        delta_d = mean_d - mean_a_d
+        delta_m = mean_m - mean_a_m
+        self.m2_depth = max(self.m2_depth - m2_d - delta_d ** 2 * n_a * n_b / n, 0.0)
+        self.m2_magnitude = max(self.m2_magnitude - m2_m - delta_m ** 2 * n_a * n_b / n, 0.0)
+        self.co_moment -= co + delta_d * delta_m * n_a * n_b / n
+        self.mean_depth = mean_a_d
+        self.mean_magnitude = mean_a_m
+        self.count = n_a
+
+    def _update_top(self, ids, magnitude, cities):
+        if self._top_stale:
+            return
+        candidates = np.flatnonzero(np.isfinite(magnitude))
+        if len(candidates) > self.top_count:
+            candidates = candidates[np.argpartition(-magnitude[candidates], self.top_count)[:self.top_count]]
+        for i in candidates:
+            self._push_top((magnitude[i], next(self._sequence), ids[i], cities[i]))
+
+    def _push_top(self, item):
+        if len(self._top) < self.top_count:
+            heapq.heappush(self._top, item)
+        elif item[0] > self._top[0][0]:
+            heapq.heapreplace(self._top, item)
+
+    def _rebuild_top(self):
+        self._top = []
+        for event_id, (_, magnitude, _, _, _, _, city, _) in self.events.items():
+            if math.isfinite(magnitude):
+                self._push_top((magnitude, next(self._sequence), event_id, city))
+        self._top_stale = False
+
+    def _update_buckets(self, times, magnitude, sign):
+        valid = ~np.isnat(times) & np.isfinite(magnitude)
+        if not valid.any():
+            return
+        days = times[valid].view(np.int64) // NS_PER_DAY
+        bins = np.floor(magnitude[valid] * MAGNITUDE_BIN + 1e-6).astype(np.int64)
+        keys, counts = np.unique(np.stack([days, bins], axis=1), axis=0, return_counts=True)
+        for (day, magnitude_bin), count in zip(keys.tolist(), counts.tolist()):
+            self.buckets[(day, magnitude_bin)] += sign * count
+            if self.buckets[(day, magnitude_bin)] == 0:
+                del self.buckets[(day, magnitude_bin)]
+
+    def _index(self, ids, times, latitude, longitude, magnitude, places):
+        # Новите събития се подреждат по низходящ магнитуд и се сравняват с вече известните главни земетресения
+        order = np.argsort(-magnitude, kind='stable')
+        offset = len(self.clusters)
+        main_of = self.clusters.add(times[order], latitude[order], longitude[order], magnitude[order])
+        positions = np.arange(offset, offset + len(main_of))
+        is_main = main_of == positions
+
+        batch_ids = [ids[i] for i in order]
+        self.cluster_ids.extend(batch_ids)
+        self.main_of.update(zip(batch_ids, main_of.tolist()))
+        for j in np.flatnonzero(is_main):
+            self.main_quakes[int(positions[j])] = (places[order[j]], pd.Timestamp(times[order[j]]))
+        self.aftershock_counts.update(main_of[~is_main].tolist())
+
+    def _ensure_clusters(self):
+        # Декластеризация наново на всички текущи събития, след като е премахнато главно земетресение
+        if not self._clusters_stale:
+            return
+        self._reset_clusters()
+        if not self.events:
+            return
+        ids = list(self.events)
+        _, magnitude, times, latitude, longitude, _, _, places = zip(*self.events.values())
+        self._index(ids, np.array(times, dtype=np.int64).view('datetime64[ns]'), np.array(latitude, dtype=float),
+                    np.array(longitude, dtype=float), np.array(magnitude, dtype=float), np.array(places, dtype=object))
+
+    @property
+    def correlation(self):
+        denominator = math.sqrt(self.m2_depth * self.m2_magnitude)
+        return self.co_moment / denominator if denominator > 0 else float('nan')
+
+    @property
+    def main_shocks(self):
+        self._ensure_clusters()
+        return len(self.main_quakes)
+
+    @property
+    def aftershocks(self):
+        self._ensure_clusters()
+        return sum(self.aftershock_counts.values())
+
+    def top_earthquakes(self):
+        if self._top_stale:
+            self._rebuild_top()
+        top = sorted(self._top, key=lambda item: (-item[0], item[1]))
+        return '\n'.join(f"Магнитуд {magnitude:.1f} - {city}" for magnitude, _, _, city in top)
+
+    def most_affected_region(self):
+        if not self.country_counts:
+            return "Няма данни", 0
+        return self.country_counts.most_common(1)[0]
+
+    def activity_change(self, start_date, end_date, min_magnitude):
+        # Същото като analyze_seismic_activity_change, но по натрупаните броячи (с точност до ден)
+        total_period = (end_date - start_date).days
+        mid_date = start_date + timedelta(days=total_period // 2)
+        start_day, mid_day, end_day = (np.datetime64(date, 'ns').astype(np.int64) // NS_PER_DAY
+                                       for date in (start_date, mid_date, end_date))
+        min_bin = round(min_magnitude * MAGNITUDE_BIN)
+
+        first_half_count = second_half_count = 0
+        for (day, magnitude_bin), count in self.buckets.items():
+            if magnitude_bin < min_bin:
+                continue
+            if start_day <= day < mid_day:
+                first_half_count += count
+            elif mid_day <= day < end_day:
+                second_half_count += count
+        return format_activity_change(first_half_count, second_half_count, total_period)
+
+    def aftershock_leaders(self, count=3):
+        self._ensure_clusters()
+        return [(self.main_quakes[main][0], self.main_quakes[main][1], aftershocks)
+                for main, aftershocks in self.aftershock_counts.most_common(count)]
+
+    def summary(self):
+        # Моментна снимка на натрупаните стойности (напр. за предаване към друга нишка)
+        return {
+            'events': len(self.events),
+            'mean_magnitude': self.mean_magnitude if self.count else float('nan'),
+            'mean_depth': self.mean_depth if self.count else float('nan'),
+            'correlation': self.correlation,
+            'main_shocks': self.main_shocks,
+            'aftershocks': self.aftershocks,
+            'top_earthquakes': self.top_earthquakes(),
+        }
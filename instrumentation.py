@@ -0,0 +1,174 @@
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger('earthquake_analyzer')
+
+# Режим на подробно измерване: 'cprofile' или 'tracemalloc' (по подразбиране изключен)
+PROFILE_MODE = os.environ.get('EQA_PROFILE') or None
+# Директория за JSON файлове с измерванията на всеки анализ
+TRACE_DIR = os.environ.get('EQA_TRACE_DIR') or None
+PROFILE_LINES = 25
+ALLOCATION_LINES = 10
+
+
+def peak_rss():
+    # Най-голямата заета памет на процеса досега (в байтове), ако е достъпна
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def current_rss():
+    # Заетата в момента памет на процеса (в байтове); ru_maxrss дава само най-голямата досега
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def format_bytes(value, sign=False):
+    if value is None:
+        return '-'
+    return f"{value / (1024 * 1024):{'+' if sign else ''}.1f} MB"
+
+
+def log_value(value):
+    # Стойности с интервали или кавички се записват в кавички, за да остане редът във вид ключ=стойност
+    text = str(value)
+    if not text or any(c.isspace() or c in '"=' for c in text):
+        return json.dumps(text, ensure_ascii=False)
+    return text
+
+
+def log_record(name, record):
+    return ' '.join(f"{key}={log_value(value)}" for key, value in [('trace', name)] + list(record.items()))
+
+
+class Trace:
+    # Измервания по етапи: време, брой събития, изтеглени байтове и промяна на заетата памет.
+    # start() затваря предходния етап, така че може да се ползва директно като progress функция.
+    def __init__(self, name, capture=PROFILE_MODE):
+        self.name = name
+        self.capture = capture
+        self.created = datetime.now()
+        self.stages = []
+        self.current = None
+        self.started = time.perf_counter()
+        self.seconds = None
+        self.peak_rss = None
+        self.profile = None
+        self.allocations = None
+
+        self.profiler = None
+        if capture == 'cprofile':
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        elif capture == 'tracemalloc' and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def start(self, stage, **details):
+        self.stop()
+        if self.capture == 'tracemalloc':
+            tracemalloc.reset_peak()
+        self.current = dict(stage=stage, **details)
+        self.current['_rss'] = current_rss()
+        self.current['_started'] = time.perf_counter()
+
+    def record(self, stage, seconds, **details):
+        # Етап, измерен другаде (напр. в процеса на диаграмата), без да се затваря текущият
+        record = dict(stage=stage, seconds=seconds, **details)
+        self.stages.append(record)
+        logger.info(log_record(self.name, record))
+
+    def annotate(self, **details):
+        if self.current is not None:
+            self.current.update(details)
+
+    def stop(self):
+        record = self.current
+        if record is None:
+            return
+        self.current = None
+        record['seconds'] = time.perf_counter() - record.pop('_started')
+        rss_before = record.pop('_rss')
+        rss_after = current_rss()
+        if rss_before is not None and rss_after is not None:
+            record['rss_delta'] = rss_after - rss_before
+        if self.capture == 'tracemalloc':
+            # Пикът е нулиран в start(), така че това е най-голямата памет, заделена по време на етапа
+            record['peak_traced'] = tracemalloc.get_traced_memory()[1]
+        self.stages.append(record)
+        logger.info(log_record(self.name, record))
+
+    def finish(self):
+        self.stop()
+        self.seconds = time.perf_counter() - self.started
+        self.peak_rss = peak_rss()
+        if self.profiler is not None:
+            self.profiler.disable()
+            out = io.StringIO()
+            pstats.Stats(self.profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_LINES)
+            self.profile = out.getvalue()
+            self.profiler = None
+        elif self.capture == 'tracemalloc' and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            self.allocations = [str(stat) for stat in snapshot.statistics('lineno')[:ALLOCATION_LINES]]
+        logger.info(log_record(self.name, {'stage': 'total', 'seconds': self.seconds, 'peak_rss': self.peak_rss}))
+        return self
+
+    def summary(self, labels=None):
+        labels = labels or {}
+        lines = []
+        for record in self.stages:
+            line = f"{labels.get(record['stage'], record['stage'])}: {record['seconds']:.2f} с"
+            if 'events' in record:
+                line += f", {record['events']} събития"
+            if record.get('bytes'):
+                line += f", {format_bytes(record['bytes'])} изтеглени"
+            if 'rss_delta' in record:
+                line += f", памет {format_bytes(record['rss_delta'], sign=True)}"
+            if 'peak_traced' in record:
+                line += f", пик на етапа {format_bytes(record['peak_traced'])}"
+            lines.append(line)
+        if self.seconds is not None:
+            lines.append(f"Общо: {self.seconds:.2f} с")
+        if self.peak_rss is not None:
+            lines.append(f"Максимална памет на процеса: {format_bytes(self.peak_rss)}")
+        return '\n'.join(lines)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'created': self.created.isoformat(timespec='seconds'),
+            'capture': self.capture,
+            'seconds': self.seconds,
+            'peak_rss': self.peak_rss,
+            'stages': self.stages,
+            'profile': self.profile,
+            'allocations': self.allocations,
+        }
+
+    def write(self, directory=TRACE_DIR):
+        if directory is None:
+            return None
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"trace_{self.created.strftime('%Y%m%d_%H%M%S_%f')}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2, default=str)
+        return path
@@ -0,0 +1,87 @@
+import json
+
+READ_SIZE = 1 << 20  # 1 MB текст на едно четене
+WHITESPACE = ' \t\n\r'
+
+_decoder = json.JSONDecoder()
+
+
+class _StreamBuffer:
+    # Буфер, който пази само непрочетената част от потока
+    def __init__(self, stream, read_size):
+        self.stream = stream
+        self.read_size = read_size
+        self.text = ''
+        self.pos = 0
+
+    def fill(self):
+        chunk = self.stream.read(self.read_size)
+        if not chunk:
+            return False
+        self.text = self.text[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                raise ValueError("Неочакван край на JSON данните")
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Невалиден JSON: очаква се '{char}' на позиция {self.pos}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                # Стойността е прекъсната от края на буфера
+                if not self.fill():
+                    raise
+                continue
+            # Число в края на буфера може да продължава в следващото четене
+            if end == len(self.text) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_features(stream, read_size=READ_SIZE):
+    # Последователно извличане на елементите от масива "features" на GeoJSON обект,
+    # без целият отговор да се зарежда в паметта
+    buffer = _StreamBuffer(stream, read_size)
+    buffer.expect('{')
+    if buffer.peek() == '}':
+        return
+    while True:
+        key = buffer.value()
+        buffer.expect(':')
+        if key == 'features':
+            buffer.expect('[')
+            if buffer.peek() == ']':
+                buffer.expect(']')
+            else:
+                while True:
+                    yield buffer.value()
+                    if buffer.peek() != ',':
+                        buffer.expect(']')
+                        break
+                    buffer.expect(',')
+        else:
+            buffer.value()
+        if buffer.peek() != ',':
+            buffer.expect('}')
+            return
+        buffer.expect(',')
+
+
+def read_features(path, read_size=READ_SIZE):
+    with open(path, encoding='utf-8') as stream:
+        yield from iter_features(stream, read_size)
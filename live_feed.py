@@ -0,0 +1,197 @@
+import argparse
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from data_fetcher import DEFAULT_TIMEOUT, create_session
+from data_processor import COLUMNS, columns_to_frame, concat_chunks, extract_columns
+from incremental import IncrementalAnalysis
+
+FEED_BASE_URL = "https://earthquake.usgs.gov/earthquakes/feed/v1.0/summary"
+FEEDS = ['significant_hour', '4.5_hour', '2.5_hour', '1.0_hour', 'all_hour',
+         'significant_day', '4.5_day', '2.5_day', '1.0_day', 'all_day']
+DEFAULT_FEED = 'all_hour'
+POLL_INTERVAL = 60  # секунди - USGS обновява обобщените потоци веднъж в минута
+MAX_AGE = timedelta(days=1)  # най-дългият обобщен поток обхваща последното денонощие
+
+
+def feed_url(feed=DEFAULT_FEED, base_url=FEED_BASE_URL):
+    return f"{base_url}/{feed}.geojson"
+
+
+class FeedPoller:
+    # Условни заявки към обобщен поток на USGS: при непроменен поток сървърът връща 304 без тяло,
+    # а от променения поток се връщат само новите и обновените събития
+    def __init__(self, url=None, min_magnitude=None, session=None):
+        self.url = url or feed_url()
+        self.min_magnitude = min_magnitude
+        self.session = session or create_session(max_workers=1)
+        self.etag = None
+        self.last_modified = None
+        self.known = {}  # идентификатор -> време на последното обновяване
+        self.listed = set()  # събития над минималния магнитуд, вече върнати като нови
+        self.generated = None
+        self.requests = 0
+        self.not_modified = 0
+        self.bytes = 0
+
+    def _headers(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def poll(self):
+        # Връща (нови, обновени) събития или None, ако потокът не е променен
+        response = self.session.get(self.url, headers=self._headers(), timeout=DEFAULT_TIMEOUT)
+        self.requests += 1
+        self.bytes += len(response.content)
+        if response.status_code == 304:
+            self.not_modified += 1
+            return None
+        response.raise_for_status()
+        self.etag = response.headers.get('ETag')
+        self.last_modified = response.headers.get('Last-Modified')
+
+        data = response.json()
+        generated = data.get('metadata', {}).get('generated')
+        if generated is not None:
+            self.generated = generated
+
+        new, updated = [], []
+        features = data.get('features', [])
+        for feature in features:
+            event_id = feature.get('id')
+            version = feature['properties'].get('updated') or 0
+            previous = self.known.get(event_id)
+            if previous is not None and previous >= version:
+                continue
+            self.known[event_id] = version
+            magnitude = feature['properties'].get('mag')
+            if self.min_magnitude is not None and (magnitude is None or magnitude < self.min_magnitude):
+                continue
+            # Събитие, преразгледано над минималния магнитуд, е ново за получателя
+            (updated if event_id in self.listed else new).append(feature)
+            self.listed.add(event_id)
+
+        # Потокът е плъзгащ се прозорец - излезлите от него събития не се връщат повече
+        current = {feature.get('id') for feature in features}
+        self.known = {event_id: version for event_id, version in self.known.items() if event_id in current}
+        self.listed &= current
+        return new, updated
+
+    def close(self):
+        self.session.close()
+
+
+def features_to_frame(features):
+    # Таблица като тази от process_data, индексирана по идентификатора на събитието
+    columns = extract_columns(features)
+    if columns is None:
+        return pd.DataFrame(columns=COLUMNS)
+    frame = columns_to_frame(columns)
+    frame.index = pd.Index([feature.get('id') for feature in features], name='id')
+    return frame
+
+
+class LiveCatalog:
+    # Таблицата със събития в паметта, към която се прилагат само промените от потока.
+    # Статистиките се обновяват с IncrementalAnalysis само за новите, обновените и изтеклите събития
+    def __init__(self, max_age=MAX_AGE, analysis=None):
+        self.max_age = max_age
+        self.analysis = analysis if analysis is not None else IncrementalAnalysis()
+        self.df = pd.DataFrame(columns=COLUMNS, index=pd.Index([], name='id'))
+
+    def apply(self, delta):
+        if len(delta) == 0:
+            return self.df
+        frames = [self.df[~self.df.index.isin(delta.index)], delta] if len(self.df) else [delta]
+        df = concat_chunks(frames)
+        df.index = pd.Index(np.concatenate([frame.index.to_numpy() for frame in frames]), name='id')
+        self.analysis.update(delta)
+        if self.max_age is not None:
+            expired = ~(df['time'] >= df['time'].max() - self.max_age)
+            if expired.any():
+                self.analysis.remove(df.index[expired])
+                df = df[~expired]
+        self.df = df.sort_values('time', ascending=False)
+        return self.df
+
+
+def feed_latency(generated, now=None):
+    # Закъснение в секунди от генерирането на потока (metadata.generated, в ms) до момента на показване
+    if generated is None:
+        return None
+    now = time.time() if now is None else now
+    return now - generated / 1000
+
+
+def run_live(poller, catalog, on_update, interval=POLL_INTERVAL, stop_event=None, on_error=None):
+    # Цикъл на допитване до потока; on_update получава речник с промените и текущата таблица
+    stop_event = stop_event or threading.Event()
+    while not stop_event.is_set():
+        try:
+            changes = poller.poll()
+        except Exception as e:
+            if on_error is None:
+                raise
+            on_error(e)
+            changes = None
+
+        if changes is not None and (changes[0] or changes[1]):
+            new, updated = changes
+            delta = features_to_frame(new + updated)
+            on_update({
+                'new': delta.iloc[:len(new)],
+                'updated': delta.iloc[len(new):],
+                'df': catalog.apply(delta),
+                'statistics': catalog.analysis.summary(),
+                'generated': poller.generated,
+                'received': time.time(),
+            })
+        stop_event.wait(interval)
+
+
+def print_update(update, out=sys.stdout):
+    latency = feed_latency(update['generated'])
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] нови: {len(update['new'])}, "
+          f"обновени: {len(update['updated'])}, общо: {len(update['df'])}"
+          + (f", закъснение: {latency:.1f} с" if latency is not None else ""), file=out)
+    statistics = update['statistics']
+    print(f"  среден магнитуд: {statistics['mean_magnitude']:.2f}, главни земетресения: {statistics['main_shocks']}, "
+          f"афтършокове: {statistics['aftershocks']}", file=out)
+    for label, events in (('+', update['new']), ('~', update['updated'])):
+        for _, event in events.iterrows():
+            print(f"  {label} {event['time']:%Y-%m-%d %H:%M:%S} M{event['magnitude']:.1f} {event['place']}", file=out)
+    out.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Следене на сеизмичната активност в реално време')
+    parser.add_argument('--feed', choices=FEEDS, default=DEFAULT_FEED, help='обобщен поток на USGS')
+    parser.add_argument('--url', default=None, help='друг адрес на потока (напр. локален тестов сървър)')
+    parser.add_argument('--min-magnitude', type=float, default=None, help='минимален магнитуд')
+    parser.add_argument('--interval', type=float, default=POLL_INTERVAL, help='интервал на допитване в секунди')
+    args = parser.parse_args(argv)
+
+    poller = FeedPoller(args.url or feed_url(args.feed), args.min_magnitude)
+    try:
+        run_live(poller, LiveCatalog(), print_update, args.interval,
+                 on_error=lambda e: print(f"Грешка при допитване: {e}", file=sys.stderr))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        poller.close()
+        print(f"Заявки: {poller.requests}, без промяна (304): {poller.not_modified}, "
+              f"изтеглени байтове: {poller.bytes}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,7 +1,10 @@
+import logging
 import wx
 from gui import SeismicAnalysisApp
 
 if __name__ == '__main__':
+    # Измерванията по етапи се записват като редове ключ=стойност
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
     app = wx.App()
     frame = SeismicAnalysisApp()
     app.MainLoop()
\ No newline at end of file
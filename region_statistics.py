@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+
+from declustering import decluster, fixed_window
+from utils import seismic_risk_level
+
+GRID_CELL_SIZE = 10.0  # градуси
+TOP_COUNT = 3
+
+
+def group_keys(df, by, cell_size=GRID_CELL_SIZE):
+    # Ключ на групата: колона от таблицата ('country', 'continent') или клетка от решетка ('grid').
+    # Събитията без координати нямат клетка (ключът е NaN) и не влизат в нито една група
+    if by != 'grid':
+        return df[by]
+    lat = df['latitude'].to_numpy(dtype=float)
+    lon = df['longitude'].to_numpy(dtype=float)
+    valid = np.isfinite(lat) & np.isfinite(lon)
+    cell_lat = (np.floor(lat[valid] / cell_size) * cell_size).astype(int)
+    cell_lon = (np.floor(lon[valid] / cell_size) * cell_size).astype(int)
+    labels = np.full(len(df), None, dtype=object)
+    labels[valid] = (pd.Series(cell_lat).astype(str) + ',' + pd.Series(cell_lon).astype(str)).to_numpy()
+    return pd.Series(pd.Categorical(labels), index=df.index)
+
+
+def _aggregate(df, keys):
+    # Едно групиране за броя, средните стойности и сумите за корелацията
+    # (отместени с общото средно за по-добра точност)
+    valid = df['magnitude'].notna() & df['depth'].notna()
+    depth = df['depth'].where(valid)
+    magnitude = df['magnitude'].where(valid)
+    d = depth - depth.mean()
+    m = magnitude - magnitude.mean()
+    sums = pd.DataFrame({'magnitude': df['magnitude'], 'depth': df['depth'],
+                         'd': d, 'm': m, 'dd': d * d, 'mm': m * m, 'dm': d * m, 'valid': valid}) \
+        .groupby(keys, observed=True).agg(count=('magnitude', 'size'),
+                                          mean_magnitude=('magnitude', 'mean'),
+                                          mean_depth=('depth', 'mean'),
+                                          d=('d', 'sum'), m=('m', 'sum'), dd=('dd', 'sum'), mm=('mm', 'sum'),
+                                          dm=('dm', 'sum'), valid=('valid', 'sum'))
+
+    n = sums['valid'].astype(float)
+    cov = sums['dm'] - sums['d'] * sums['m'] / n
+    var_d = sums['dd'] - sums['d'] ** 2 / n
+    var_m = sums['mm'] - sums['m'] ** 2 / n
+    report = sums[['count', 'mean_magnitude', 'mean_depth']].copy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        report['depth_magnitude_correlation'] = cov / np.sqrt(var_d * var_m)
+    return report
+
+
+def _top_earthquakes(df, keys, count):
+    top = df['magnitude'].groupby(keys, observed=True).nlargest(count)
+    places = df['nearest_city'].astype(object)
+    result = {}
+    for (group, index), magnitude in top.items():
+        result.setdefault(group, []).append(f"Магнитуд {magnitude:.1f} - {places.loc[index]}")
+    return {group: '\n'.join(lines) for group, lines in result.items()}
+
+
+def _most_affected(df, keys):
+    # Най-засегнатата държава във всяка група и средният магнитуд в нея (за оценката на риска)
+    by_country = df.groupby([keys, df['country']], observed=True)['magnitude'].agg(['size', 'mean'])
+    by_country = by_country[by_country['size'] > 0].sort_values('size', ascending=False, kind='stable')
+    first = by_country[~by_country.index.get_level_values(0).duplicated()]
+    return first.reset_index(level=1)
+
+
+def _aftershock_counts(df, keys, window):
+    # Една декластеризация за всички групи: дължините на всяка група се отместват с повече от
+    # обиколката на Земята и най-големия радиус, така че събития от различни групи никога не се свързват
+    codes, groups = pd.factorize(keys)
+    used = np.flatnonzero(codes >= 0)
+    # Подреждане по група и низходящ магнитуд - събитията от една група са съседни
+    order = used[np.lexsort((-df['magnitude'].to_numpy(dtype=float)[used], codes[used]))]
+    codes = codes[order]
+
+    _, radius = window(df['magnitude'].to_numpy(dtype=float)[order])
+    radius = np.asarray(radius, dtype=float)
+    finite = radius[np.isfinite(radius)]
+    offset = 360 + 4 * (finite.max() if len(finite) else 0)
+    main_of = decluster(df['time'].to_numpy(dtype='datetime64[ns]')[order],
+                        df['latitude'].to_numpy(dtype=float)[order],
+                        df['longitude'].to_numpy(dtype=float)[order] + codes * offset,
+                        df['magnitude'].to_numpy(dtype=float)[order],
+                        window=window)
+
+    is_main = main_of == np.arange(len(main_of))
+    main_shocks = np.bincount(codes, weights=is_main, minlength=len(groups)).astype(int)
+    events = np.bincount(codes, minlength=len(groups))
+    return {group: (int(main_shocks[i]), int(events[i] - main_shocks[i])) for i, group in enumerate(groups)}
+
+
+def grouped_statistics(df, by='continent', cell_size=GRID_CELL_SIZE, top_count=TOP_COUNT,
+                       window=fixed_window, aftershocks=True):
+    # Статистиките от analyze_earthquake_data за всички региони наведнъж
+    keys = group_keys(df, by, cell_size)
+    keys = keys.rename('region')
+
+    report = _aggregate(df, keys)
+
+    top = _top_earthquakes(df, keys, top_count)
+    report['top_earthquakes'] = [top.get(group, '') for group in report.index]
+
+    most_affected = _most_affected(df, keys).reindex(report.index)
+    report['most_affected_region'] = most_affected['country']
+    report['affected_region_count'] = most_affected['size'].fillna(0).astype(int)
+    report['hazard_level'] = [seismic_risk_level(mean) for mean in most_affected['mean']]
+
+    if aftershocks:
+        counts = _aftershock_counts(df, keys, window)
+        report['main_shocks'] = [counts.get(group, (0, 0))[0] for group in report.index]
+        report['aftershocks'] = [counts.get(group, (0, 0))[1] for group in report.index]
+
+    return report
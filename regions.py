@@ -0,0 +1,183 @@
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+import shapely
+from shapely.strtree import STRtree
+
+from utils import get_continents
+
+NATURAL_EARTH_RESOLUTION = '50m'
+# Без изтегляне: използват се само вече изтеглените граници (напр. при тестовете)
+OFFLINE = bool(os.environ.get('EQA_OFFLINE'))
+RETRY_INTERVAL = 300  # секунди до нов опит за зареждане на границите след неуспех
+COUNTRY_MAX_DISTANCE = 1.0  # градуси (~111 км) - земетресения край бреговете се отнасят към най-близката държава
+DETACHED_PART_DISTANCE = 15.0  # градуси - отдалечени части на държава (напр. Аляска, Френска Гвиана)
+
+CONTINENT_NAMES = {
+    'Africa': 'Африка',
+    'Antarctica': 'Антарктика',
+    'Asia': 'Азия',
+    'Europe': 'Европа',
+    'North America': 'Северна Америка',
+    'Oceania': 'Океания',
+    'South America': 'Южна Америка',
+}
+
+# Части на държави, разположени на два континента (интервали по дължина)
+TRANSCONTINENTAL = {
+    'Russia': ([(60.0, 180.0), (-180.0, -160.0)], 'Азия'),
+}
+
+logger = logging.getLogger('earthquake_analyzer')
+_indexes = {}  # резолюция -> RegionIndex
+_failed_at = {}  # резолюция -> момент на последния неуспешен опит
+_lock = threading.Lock()
+
+
+class RegionIndex:
+    def __init__(self, geometries, countries, continents):
+        self.geometries = np.asarray(geometries, dtype=object)
+        self.countries = np.asarray(countries, dtype=object)
+        self.continents = np.asarray(continents, dtype=object)
+        self.country_tree = STRtree(self.geometries)
+
+        # За континента се търси най-близката част с известен континент
+        self.continent_parts = np.flatnonzero(self.continents != None)  # noqa: E711
+        self.continent_tree = STRtree(self.geometries[self.continent_parts])
+
+    def lookup(self, latitudes, longitudes):
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.asarray(longitudes, dtype=float)
+        n = len(latitudes)
+        countries = np.full(n, None, dtype=object)
+        continents = np.full(n, None, dtype=object)
+
+        valid = np.flatnonzero(np.isfinite(latitudes) & np.isfinite(longitudes))
+        if len(valid) == 0:
+            return countries, continents
+        points = shapely.points(longitudes[valid], latitudes[valid])
+
+        # Държава: полигонът, който съдържа точката, или най-близкият в рамките на COUNTRY_MAX_DISTANCE
+        point_idx, part_idx = self.country_tree.query(points, predicate='intersects')
+        country_part = np.full(len(valid), -1, dtype=np.int64)
+        # При граница се взема първото съвпадение за всяка точка
+        matched, first = np.unique(point_idx, return_index=True)
+        country_part[matched] = part_idx[first]
+
+        outside = np.flatnonzero(country_part == -1)
+        if len(outside):
+            point_idx, part_idx = self.country_tree.query_nearest(points[outside], max_distance=COUNTRY_MAX_DISTANCE,
+                                                                  all_matches=False)
+            country_part[outside[point_idx]] = part_idx
+
+        found = country_part >= 0
+        countries[valid[found]] = self.countries[country_part[found]]
+
+        # Континент: от намерената държава, а за откритото море - от най-близката суша
+        continent_part = np.where(found, country_part, -1)
+        continent_part[found & (self.continents[np.maximum(country_part, 0)] == None)] = -1  # noqa: E711
+        missing = np.flatnonzero(continent_part == -1)
+        if len(missing):
+            point_idx, part_idx = self.continent_tree.query_nearest(points[missing], all_matches=False)
+            continent_part[missing[point_idx]] = self.continent_parts[part_idx]
+        resolved = continent_part >= 0
+        continents[valid[resolved]] = self.continents[continent_part[resolved]]
+
+        source = np.full(len(valid), None, dtype=object)
+        source[resolved] = self.countries[continent_part[resolved]]
+        for country, (ranges, continent) in TRANSCONTINENTAL.items():
+            for west, east in ranges:
+                part = (source == country) & (longitudes[valid] > west) & (longitudes[valid] <= east)
+                continents[valid[part]] = continent
+
+        return countries, continents
+
+
+def build_region_index(records):
+    # records: итерируеми (геометрия, държава, континент на английски)
+    geometries, countries, continents, owners = [], [], [], []
+    for owner, (geometry, country, continent) in enumerate(records):
+        for part in shapely.get_parts(geometry):
+            geometries.append(part)
+            countries.append(country)
+            continents.append(CONTINENT_NAMES.get(continent))
+            owners.append(owner)
+
+    geometries = np.asarray(geometries, dtype=object)
+    continents = np.asarray(continents, dtype=object)
+    owners = np.asarray(owners)
+    areas = shapely.area(geometries)
+    centroids = shapely.centroid(geometries)
+
+    # Отдалечените части на държава получават континента на най-близката друга държава
+    for owner in np.unique(owners):
+        parts = np.flatnonzero(owners == owner)
+        if len(parts) < 2:
+            continue
+        main_part = parts[np.argmax(areas[parts])]
+        detached = parts[shapely.distance(centroids[parts], centroids[main_part]) > DETACHED_PART_DISTANCE]
+        others = np.flatnonzero((owners != owner) & (continents != None))  # noqa: E711
+        if len(detached) == 0 or len(others) == 0:
+            continue
+        tree = STRtree(geometries[others])
+        nearest = tree.query_nearest(geometries[detached], all_matches=False)
+        continents[detached[nearest[0]]] = continents[others[nearest[1]]]
+
+    return RegionIndex(geometries, countries, continents)
+
+
+def natural_earth_path(resolution=NATURAL_EARTH_RESOLUTION, download=True):
+    # Файлът с границите на държавите от Natural Earth, който Cartopy изтегля и пази локално
+    from cartopy import config
+    from cartopy.io import Downloader, shapereader
+
+    if download:
+        return shapereader.natural_earth(resolution=resolution, category='cultural', name='admin_0_countries')
+    downloader = Downloader.from_config(('shapefiles', 'natural_earth', resolution, 'cultural', 'admin_0_countries'))
+    format_dict = {'config': config, 'category': 'cultural', 'name': 'admin_0_countries', 'resolution': resolution}
+    for path in (downloader.pre_downloaded_path(format_dict), downloader.target_path(format_dict)):
+        if path is not None and path.exists():
+            return path
+    raise OSError(f"границите от Natural Earth ({resolution}) не са изтеглени")
+
+
+def natural_earth_records(resolution=NATURAL_EARTH_RESOLUTION, download=True):
+    from cartopy.io import shapereader
+
+    path = natural_earth_path(resolution, download)
+    for record in shapereader.Reader(path).records():
+        yield record.geometry, record.attributes['NAME'], record.attributes['CONTINENT']
+
+
+def load_region_index(resolution=NATURAL_EARTH_RESOLUTION):
+    # Зареденият индекс се пази; след неуспех (напр. без интернет) се опитва отново след RETRY_INTERVAL
+    index = _indexes.get(resolution)
+    if index is not None:
+        return index
+    with _lock:
+        index = _indexes.get(resolution)
+        if index is not None:
+            return index
+        failed_at = _failed_at.get(resolution)
+        if failed_at is not None and time.monotonic() - failed_at < RETRY_INTERVAL:
+            return None
+        try:
+            index = build_region_index(natural_earth_records(resolution, download=not OFFLINE))
+        except OSError as e:
+            _failed_at[resolution] = time.monotonic()
+            logger.warning("Границите на държавите не са налични (%s); континентите се определят приблизително", e)
+            return None
+        _failed_at.pop(resolution, None)
+        _indexes[resolution] = index
+        return index
+
+
+def assign_regions(latitudes, longitudes):
+    # Връща (държави, континенти) за целите масиви от координати; държавата е None, ако не е определена
+    index = load_region_index()
+    if index is None:
+        return np.full(len(latitudes), None, dtype=object), get_continents(latitudes, longitudes)
+    return index.lookup(latitudes, longitudes)
@@ -0,0 +1,71 @@
+import io
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from cancellation import AnalysisCancelled, check_cancelled
+
+RENDER_WORKERS = 4  # по един процес за всяка диаграма от analyzer.visualize_earthquake_data
+CANCEL_POLL_INTERVAL = 0.1  # секунди между проверките за прекратяване, докато се чакат диаграмите
+
+_pool = None
+
+
+def figure_to_png(figure, **savefig_kwargs):
+    # Изчертаване на фигурата в паметта (Agg), без запис във файл
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    FigureCanvasAgg(figure)
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format='png', **savefig_kwargs)
+    return buffer.getvalue()
+
+
+def render_pool():
+    # Общ пул от процеси; 'spawn' е безопасен и при работещи нишки на wx
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+
+def shutdown_render_pool(wait=True):
+    # wait=False не блокира извикващата нишка (напр. при затваряне на прозореца) заради започнатите диаграми
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=wait, cancel_futures=True)
+        _pool = None
+
+
+def timed(function, *args):
+    # Изпълнява се в процеса на диаграмата, за да се измери само изчертаването, без чакането в опашката
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def render_charts(jobs, parallel=True, cancel_event=None, timings=None):
+    # jobs: {име: (функция, аргументи)}; връща {име: PNG байтове}.
+    # timings (речник), ако е подаден, получава времето за изчертаване на всяка диаграма в секунди
+    timings = {} if timings is None else timings
+    if not parallel:
+        images = {}
+        for name, (function, args) in jobs.items():
+            check_cancelled(cancel_event)
+            images[name], timings[name] = timed(function, *args)
+        return images
+
+    pool = render_pool()
+    futures = {name: pool.submit(timed, function, *args) for name, (function, args) in jobs.items()}
+    pending = set(futures.values())
+    while pending:
+        if cancel_event is not None and cancel_event.is_set():
+            # Неизпълнените диаграми се отменят, а вече започнатите се изоставят - резултатът им не се чака
+            for future in pending:
+                future.cancel()
+            raise AnalysisCancelled("Анализът е прекратен от потребителя")
+        _, pending = wait(pending, timeout=CANCEL_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+    images = {}
+    for name, future in futures.items():
+        images[name], timings[name] = future.result()
+    return images
@@ -0,0 +1,130 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.earthquake_analyzer', 'results')
+MEMORY_BUDGET = 256 * 1024 * 1024  # байтове
+DISK_BUDGET = 1024 * 1024 * 1024
+RESULT_FORMAT = 2  # увеличава се при всяка промяна на вида на резултатите, за да не се четат остарели файлове
+
+
+def data_fingerprint(features):
+    # Отпечатък на входните данни: идентификаторите и времената на обновяване на всички събития
+    pairs = sorted((feature.get('id') or '', feature['properties'].get('updated') or 0) for feature in features)
+    digest = hashlib.blake2b(digest_size=16)
+    for event_id, updated in pairs:
+        digest.update(f"{event_id}\t{updated}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def result_key(fingerprint, *parameters):
+    # Ключ на резултата: форматът, отпечатъкът на данните и параметрите на анализа
+    digest = hashlib.blake2b(f"{RESULT_FORMAT}\t{fingerprint}".encode('ascii'), digest_size=16)
+    for parameter in parameters:
+        digest.update(repr(parameter).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    # LRU кеш в паметта с ограничение по размер и незадължително ниво на диска
+    def __init__(self, max_bytes=MEMORY_BUDGET, disk_dir=None, disk_max_bytes=DISK_BUDGET):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.entries = OrderedDict()  # ключ -> (стойност, размер)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, f'result_{key}.pickle')
+
+    def get(self, key, valid=None):
+        # valid(стойност) отхвърля резултати с неочакван вид - те се броят като липсващи
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and (valid is None or valid(entry[0])):
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        value = self._load(key)
+        with self.lock:
+            if value is None or (valid is not None and not valid(value[0])):
+                self.misses += 1
+                return None
+            self.hits += 1
+        self._remember(key, value[0], value[1])
+        return value[0]
+
+    def put(self, key, value):
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self._remember(key, value, len(payload))
+        if self.disk_dir is not None:
+            self._store(key, payload)
+        return value
+
+    def _remember(self, key, value, size):
+        with self.lock:
+            if size > self.max_bytes:
+                return
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous[1]
+            self.entries[key] = (value, size)
+            self.size += size
+            # Премахване на най-отдавна използваните резултати
+            while self.size > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.size -= evicted_size
+
+    def _load(self, key):
+        if self.disk_dir is None:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                payload = f.read()
+            os.utime(path)  # времето на последно използване определя реда на премахване от диска
+            return pickle.loads(payload), len(payload)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            # Липсващ, повреден или записан от друга версия на програмата файл
+            return None
+
+    def _store(self, key, payload):
+        # Запис през временен файл, за да не се четат наполовина записани резултати
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=self.disk_dir)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+            os.replace(temp_path, self._path(key))
+            self._trim_disk()
+        except OSError:
+            pass
+
+    def _trim_disk(self):
+        files = []
+        for name in os.listdir(self.disk_dir):
+            if name.startswith('result_') and name.endswith('.pickle'):
+                stat = os.stat(os.path.join(self.disk_dir, name))
+                files.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in files)
+        for _, size, name in sorted(files):
+            if total <= self.disk_max_bytes:
+                break
+            os.remove(os.path.join(self.disk_dir, name))
+            total -= size
+
+    def clear(self, disk=False):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+        if disk and self.disk_dir is not None and os.path.isdir(self.disk_dir):
+            for name in os.listdir(self.disk_dir):
+                if name.startswith('result_') and name.endswith('.pickle'):
+                    os.remove(os.path.join(self.disk_dir, name))
@@ -0,0 +1,186 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from declustering import decluster, fixed_window
+from event_table import as_frame
+from region_statistics import GRID_CELL_SIZE, group_keys
+
+NS_PER_DAY = 24 * 60 * 60 * 10 ** 9
+ALL_REGIONS = 'Всички'
+WINDOW_COUNT = 30  # брой прозорци по подразбиране в избрания период
+MAGNITUDE_BIN = 0.1
+MIN_EVENTS = 50  # най-малък брой събития в прозорец за оценка на b-стойността
+Z_THRESHOLD = 3.0  # ~ p < 0.003 при нормално приближение на разпределението на Поасон
+
+
+def seismic_moment(magnitudes):
+    # Сеизмичен момент в N·m по Ханкс и Канамори: log10(M0) = 1.5M + 9.1
+    return 10 ** (1.5 * np.asarray(magnitudes, dtype=float) + 9.1)
+
+
+def completeness_magnitude(magnitudes, magnitude_bin=MAGNITUDE_BIN, correction=0.2):
+    # Магнитуд на пълнота по метода на максималната кривина (с корекция +0.2 по Woessner и Wiemer)
+    magnitudes = np.asarray(magnitudes, dtype=float)
+    magnitudes = magnitudes[np.isfinite(magnitudes)]
+    if len(magnitudes) == 0:
+        return np.nan
+    bins = np.round(magnitudes / magnitude_bin).astype(np.int64)
+    values, counts = np.unique(bins, return_counts=True)
+    return values[np.argmax(counts)] * magnitude_bin + correction
+
+
+def default_window(start_date, end_date, count=WINDOW_COUNT):
+    window = max((end_date - start_date) / count, timedelta(days=1))
+    return window, window / 4
+
+
+def rate_engine(df, start_date=None, end_date=None, window=None, step=None, by=None, cell_size=GRID_CELL_SIZE,
+                min_magnitude=None, completeness=None, magnitude_bin=MAGNITUDE_BIN, min_events=MIN_EVENTS,
+                z_threshold=Z_THRESHOLD, main_shocks_only=False, declustering_window=fixed_window):
+    # Плъзгащи се прозорци за всички региони наведнъж: едно сортиране по (регион, време),
+    # след което броят, моментът и сумите за b-стойността във всеки прозорец са разлики на кумулативни суми.
+    # Резултатът са масиви с форма (региони, прозорци), готови за изчертаване.
+    columns = ['time', 'magnitude', 'latitude', 'longitude'] + ([by] if by in ('country', 'continent') else [])
+    df = as_frame(df, columns)
+    magnitudes = df['magnitude'].to_numpy(dtype=float)
+    times = df['time'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+    valid = np.isfinite(magnitudes) & (times != np.iinfo(np.int64).min)
+    if min_magnitude is not None:
+        valid &= magnitudes >= min_magnitude
+
+    if main_shocks_only and valid.any():
+        # Само главните земетресения, за да не се отчитат последователностите от афтършокове като аномалии
+        candidates = np.flatnonzero(valid)
+        order = candidates[np.argsort(-magnitudes[candidates], kind='stable')]
+        main_of = decluster(times[order].view('datetime64[ns]'), df['latitude'].to_numpy(dtype=float)[order],
+                            df['longitude'].to_numpy(dtype=float)[order], magnitudes[order],
+                            window=declustering_window)
+        valid[order[main_of != np.arange(len(order))]] = False
+
+    if by is None:
+        region_codes = np.zeros(len(df), dtype=np.int64)
+        regions = np.array([ALL_REGIONS], dtype=object)
+    else:
+        keys = pd.Categorical(group_keys(df, by, cell_size))
+        region_codes = keys.codes.astype(np.int64)
+        valid &= region_codes >= 0
+        used = np.unique(region_codes[valid])
+        regions = np.asarray(keys.categories, dtype=object)[used]
+        region_codes = np.searchsorted(used, region_codes)
+
+    magnitudes = magnitudes[valid]
+    times = times[valid]
+    region_codes = region_codes[valid]
+
+    if (start_date is None or end_date is None) and len(times) == 0:
+        raise ValueError("Няма земетресения за изчисляване на скоростта на сеизмичност")
+    start = times.min() if start_date is None else _to_ns(start_date)
+    end = times.max() if end_date is None else _to_ns(end_date)
+    if window is None or step is None:
+        default, default_step = default_window(pd.Timestamp(start), pd.Timestamp(end))
+        window = window or default
+        step = step or default_step
+    window_ns = int(pd.Timedelta(window).value)
+    step_ns = int(pd.Timedelta(step).value)
+    window_days = window_ns / NS_PER_DAY
+    ends = np.arange(start + window_ns, end + 1, step_ns, dtype=np.int64)
+    if len(ends) == 0:
+        ends = np.array([end], dtype=np.int64)
+
+    # Едно сортиране по ключ (регион, време); времето е в дни, а регионите са отместени един от друг
+    origin = min(start, times.min()) if len(times) else start
+    last = max(ends[-1], times.max()) if len(times) else ends[-1]
+    offset = (last - origin) / NS_PER_DAY + window_days + 1
+    key = region_codes * offset + (times - origin) / NS_PER_DAY
+    order = np.argsort(key, kind='stable')
+    key = key[order]
+    magnitudes = magnitudes[order]
+
+    if completeness is None:
+        completeness = completeness_magnitude(magnitudes, magnitude_bin)
+    complete = magnitudes >= completeness - 1e-9
+
+    def cumulative(values):
+        return np.concatenate([[0.0], np.cumsum(values, dtype=float)])
+
+    cum_count = cumulative(np.ones(len(magnitudes)))
+    cum_complete = cumulative(complete)
+    cum_magnitude = cumulative(np.where(complete, magnitudes, 0.0))
+    cum_magnitude2 = cumulative(np.where(complete, magnitudes ** 2, 0.0))
+
+    # Граници на всички прозорци за всички региони: (региони, прозорци)
+    window_ends = (ends - origin) / NS_PER_DAY
+    upper_keys = np.arange(len(regions))[:, None] * offset + window_ends[None, :]
+    lower_keys = upper_keys - window_ns / NS_PER_DAY
+    upper = np.searchsorted(key, upper_keys, side='right')
+    lower = np.searchsorted(key, lower_keys, side='right')
+
+    def window_sum(cumulative_values):
+        return cumulative_values[upper] - cumulative_values[lower]
+
+    count = window_sum(cum_count).round().astype(np.int64)
+    moment = _window_totals(seismic_moment(magnitudes), lower, upper)
+
+    # b-стойност по метода на максималното правдоподобие (Аки/Утсу) и грешка по Ши и Болт
+    n = window_sum(cum_complete)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = window_sum(cum_magnitude) / n
+        b_value = np.log10(np.e) / (mean - (completeness - magnitude_bin / 2))
+        variance = (window_sum(cum_magnitude2) - n * mean ** 2) / (n * (n - 1))
+        b_error = 2.3 * b_value ** 2 * np.sqrt(np.maximum(variance, 0))
+    too_few = n < max(min_events, 2)
+    b_value[too_few] = np.nan
+    b_error[too_few] = np.nan
+
+    # Аномалии: отклонение на броя от обичайната скорост за региона (нормално приближение на Поасон).
+    # За обичайна се взема медианата по прозорците, за да не я изкривяват големите последователности.
+    period_days = max((end - start) / NS_PER_DAY, window_days)
+    region_start = np.searchsorted(key, np.arange(len(regions)) * offset + (start - origin) / NS_PER_DAY, side='left')
+    region_end = np.searchsorted(key, np.arange(len(regions)) * offset + (end - origin) / NS_PER_DAY, side='right')
+    mean_rate = (region_end - region_start) / period_days
+    background_rate = np.median(count, axis=1) / window_days if count.shape[1] else mean_rate
+    background_rate = np.where(background_rate > 0, background_rate, mean_rate)
+    expected = background_rate[:, None] * window_days
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = np.where(expected > 0, (count - expected) / np.sqrt(expected), 0.0)
+    anomaly = np.abs(z) >= z_threshold
+
+    return {
+        'time': ends.view('datetime64[ns]'),
+        'regions': regions,
+        'window_days': window_days,
+        'completeness': completeness,
+        'count': count,
+        'rate': count / window_days,
+        'moment': moment,
+        'b_value': b_value,
+        'b_error': b_error,
+        'background_rate': background_rate,
+        'z': z,
+        'anomaly': anomaly,
+    }
+
+
+def _window_totals(values, lower, upper):
+    # Моментите се различават с много порядъци, затова не се смятат като разлика на кумулативни суми
+    # (малките прозорци биха се загубили в грешката от закръгляне), а със сумиране на всеки прозорец
+    values = np.append(values, 0.0)
+    bounds = np.stack([lower.ravel(), upper.ravel()], axis=1).ravel()
+    totals = np.add.reduceat(values, bounds)[::2] if len(bounds) else np.zeros(0)
+    totals[lower.ravel() == upper.ravel()] = 0.0
+    return totals.reshape(lower.shape)
+
+
+def _to_ns(value):
+    return pd.Timestamp(value).as_unit('ns').value
+
+
+def count_between(times, bounds):
+    # Брой събития в последователни интервали [bounds[i], bounds[i+1]); последният интервал включва края си
+    times = np.sort(np.asarray(times, dtype='datetime64[ns]'))
+    bounds = np.asarray(bounds, dtype='datetime64[ns]')
+    positions = np.searchsorted(times, bounds, side='left')
+    positions[-1] = np.searchsorted(times, bounds[-1], side='right')
+    return np.diff(positions)
@@ -0,0 +1,95 @@
+import json
+import os
+import sys
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+# Тестовете не изтеглят границите от Natural Earth; ако вече са изтеглени, се използват
+os.environ.setdefault('EQA_OFFLINE', '1')
+
+from benchmarks.synthetic import synthetic_catalog  # noqa: E402
+
+
+def _milliseconds(value):
+    return int(datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+class StubFDSN:
+    # FDSN услуга в паметта с /count и /query като тези на USGS: границите на периода са включени,
+    # а заявка за повече от limit събития връща 400
+    def __init__(self, features, limit=20000):
+        self.features = features
+        self.limit = limit
+        self.failures = {}  # път -> брой оставащи отговори 503
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def select(self, query):
+        start = _milliseconds(query['starttime'][0])
+        end = _milliseconds(query['endtime'][0])
+        min_magnitude = float(query['minmagnitude'][0])
+        updated_after = _milliseconds(query['updatedafter'][0]) if 'updatedafter' in query else None
+        return [feature for feature in self.features
+                if start <= feature['properties']['time'] <= end
+                and feature['properties']['mag'] >= min_magnitude
+                and (updated_after is None or feature['properties']['updated'] > updated_after)]
+
+    def handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                path = url.path.rsplit('/', 1)[-1]
+                with stub.lock:
+                    stub.requests.append(path)
+                    failing = stub.failures.get(path, 0) > 0
+                    if failing:
+                        stub.failures[path] -= 1
+                if failing:
+                    self._send(503, b'{}')
+                    return
+
+                selected = stub.select(parse_qs(url.query))
+                if path == 'count':
+                    self._send(200, json.dumps({'count': len(selected)}).encode('utf-8'))
+                elif len(selected) > stub.limit:
+                    self._send(400, b'Error 400: too many events')
+                else:
+                    self._send(200, json.dumps({'type': 'FeatureCollection', 'features': selected}).encode('utf-8'))
+
+            def _send(self, status, body):
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+@pytest.fixture(scope='session')
+def catalog():
+    return synthetic_catalog(3000, seed=1, days=60)
+
+
+@pytest.fixture
+def fdsn(catalog):
+    stub = StubFDSN(catalog['features'])
+    server = ThreadingHTTPServer(('127.0.0.1', 0), stub.handler())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    stub.base_url = f"http://127.0.0.1:{server.server_address[1]}/fdsnws/event/1"
+    yield stub
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analyzer import analyze_aftershocks
+from benchmarks.synthetic import synthetic_catalog
+from declustering import DeclusterIndex, decluster, fixed_window, gardner_knopoff_window
+
+
+def catalog_frame(count, seed, days=60):
+    features = synthetic_catalog(count, seed=seed, days=days)['features']
+    return pd.DataFrame({
+        'magnitude': [feature['properties']['mag'] for feature in features],
+        'place': [feature['properties']['place'] for feature in features],
+        'time': pd.to_datetime([feature['properties']['time'] for feature in features], unit='ms'),
+        'latitude': [feature['geometry']['coordinates'][1] for feature in features],
+        'longitude': [feature['geometry']['coordinates'][0] for feature in features],
+    })
+
+
+def baseline_aftershocks(df):
+    # Първоначалната реализация на analyze_aftershocks (сравнение с всички главни земетресения)
+    sorted_df = df.sort_values('magnitude', ascending=False)
+
+    main_quakes = []
+    aftershocks = []
+
+    for _, quake in sorted_df.iterrows():
+        is_aftershock = False
+        for main_quake in main_quakes:
+            time_diff = abs((quake['time'] - main_quake['time']).total_seconds())
+            distance = ((quake['latitude'] - main_quake['latitude']) ** 2 +
+                        (quake['longitude'] - main_quake['longitude']) ** 2) ** 0.5
+            if time_diff <= 7 * 24 * 60 * 60 and distance <= 100 / 111:
+                aftershocks.append((main_quake, quake))
+                is_aftershock = True
+                break
+        if not is_aftershock:
+            main_quakes.append(quake)
+
+    aftershocks_count = {}
+    for main_quake, _ in aftershocks:
+        aftershocks_count[main_quake['time']] = aftershocks_count.get(main_quake['time'], 0) + 1
+
+    sorted_aftershocks = sorted(aftershocks_count.items(), key=lambda x: x[1], reverse=True)
+
+    result = f"За изследвания период има {len(main_quakes)} главни земетресения и {len(aftershocks)} вторични трусове.\n\n"
+
+    result += "Най-голям брой афтършокове се наблюдават след следните земетресения:\n"
+    for i, (time, count) in enumerate(sorted_aftershocks[:3], 1):
+        main_quake = next(quake for quake in main_quakes if quake['time'] == time)
+        result += f"{i}. {main_quake['place']}, {time.strftime('%Y-%m-%d')}, {count} афтършока\n"
+
+    result += "\nНай-малък брой афтършокове се наблюдават след следните земетресения:\n"
+    for i, (time, count) in enumerate(sorted_aftershocks[-3:], 1):
+        main_quake = next(quake for quake in main_quakes if quake['time'] == time)
+        result += f"{i}. {main_quake['place']}, {time.strftime('%Y-%m-%d')}, {count} афтършока\n"
+
+    return result
+
+
+def brute_force_main_of(times, latitudes, longitudes, magnitudes, window):
+    time_window, radius = window(magnitudes)
+    seconds = times.astype('datetime64[ns]').astype(np.int64) / 1e9
+    main_of = np.arange(len(times))
+    mains = []
+    for j in range(len(times)):
+        for m in mains:
+            distance = ((latitudes[j] - latitudes[m]) ** 2 + (longitudes[j] - longitudes[m]) ** 2) ** 0.5
+            if abs(seconds[j] - seconds[m]) <= time_window[m] and distance <= radius[m]:
+                main_of[j] = m
+                break
+        else:
+            mains.append(j)
+    return main_of
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_matches_baseline_report(seed):
+    df = catalog_frame(600, seed)
+    assert analyze_aftershocks(df) == baseline_aftershocks(df)
+
+
+def test_baseline_counts_with_nan_coordinates():
+    df = catalog_frame(300, 3)
+    df.loc[df.index[::25], 'latitude'] = np.nan
+    assert analyze_aftershocks(df) == baseline_aftershocks(df)
+
+
+@pytest.mark.parametrize('window', [fixed_window, gardner_knopoff_window])
+def test_decluster_matches_brute_force(window):
+    df = catalog_frame(800, 4).sort_values('magnitude', ascending=False)
+    arrays = (df['time'].to_numpy(dtype='datetime64[ns]'), df['latitude'].to_numpy(dtype=float),
+              df['longitude'].to_numpy(dtype=float), df['magnitude'].to_numpy(dtype=float))
+    assert np.array_equal(decluster(*arrays, window=window), brute_force_main_of(*arrays, window))
+
+
+def test_index_in_batches_matches_single_pass():
+    df = catalog_frame(800, 5).sort_values('magnitude', ascending=False)
+    arrays = [df['time'].to_numpy(dtype='datetime64[ns]'), df['latitude'].to_numpy(dtype=float),
+              df['longitude'].to_numpy(dtype=float), df['magnitude'].to_numpy(dtype=float)]
+    index = DeclusterIndex(fixed_window)
+    parts = [index.add(*[values[start:start + 100] for values in arrays]) for start in range(0, len(df), 100)]
+    assert np.array_equal(np.concatenate(parts), decluster(*arrays))
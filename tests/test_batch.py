@@ -0,0 +1,30 @@
+import json
+from datetime import datetime
+
+from batch import json_safe, parse_job, run_batch
+
+
+def strict_load(path):
+    def reject(constant):
+        raise ValueError(f"невалиден JSON: {constant}")
+
+    with open(path, encoding='utf-8') as f:
+        return json.load(f, parse_constant=reject)
+
+
+def test_empty_job_does_not_fail_the_batch(fdsn, tmp_path):
+    jobs = [parse_job({'name': 'all', 'start_date': '2024-01-01', 'end_date': '2024-02-01', 'min_magnitude': 3.0}, 0),
+            parse_job({'name': 'antarctica', 'start_date': '2024-01-01', 'end_date': '2024-01-08',
+                       'min_magnitude': 6.5, 'continent': 'Антарктика'}, 1)]
+    results = run_batch(jobs, str(tmp_path), workers=1, base_url=fdsn.base_url)
+
+    assert not any('error' in result for result in results)
+    assert results[0]['events'] > 0
+    assert results[1]['events'] == 0
+    assert results[1]['mean_magnitude'] is None
+    assert strict_load(tmp_path / 'results.json') == results
+
+
+def test_json_safe_replaces_non_finite_floats():
+    value = {'correlation': float('nan'), 'values': [1.0, float('inf'), (2, -float('inf'))], 'date': datetime.min}
+    assert json_safe(value) == {'correlation': None, 'values': [1.0, None, [2, None]], 'date': datetime.min}
@@ -0,0 +1,44 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from cancellation import AnalysisCancelled
+from declustering import decluster
+from rendering import render_charts, shutdown_render_pool
+
+
+def test_decluster_stops_when_cancelled():
+    cancel_event = threading.Event()
+    cancel_event.set()
+    n = 100
+    with pytest.raises(AnalysisCancelled):
+        decluster(np.arange(n).astype('datetime64[s]'), np.zeros(n), np.zeros(n), np.full(n, 5.0),
+                  cancel_event=cancel_event)
+
+
+def test_render_charts_stops_waiting_when_cancelled():
+    cancel_event = threading.Event()
+    threading.Timer(0.5, cancel_event.set).start()
+    started = time.perf_counter()
+    try:
+        with pytest.raises(AnalysisCancelled):
+            render_charts({'slow': (time.sleep, (3,)), 'queued': (time.sleep, (3,))}, cancel_event=cancel_event)
+        assert time.perf_counter() - started < 2.5
+    finally:
+        shutdown_render_pool()
+
+
+def test_render_charts_sequential_checks_between_charts():
+    cancel_event = threading.Event()
+    calls = []
+
+    def chart():
+        calls.append(1)
+        cancel_event.set()
+        return b''
+
+    with pytest.raises(AnalysisCancelled):
+        render_charts({'first': (chart, ()), 'second': (chart, ())}, parallel=False, cancel_event=cancel_event)
+    assert len(calls) == 1
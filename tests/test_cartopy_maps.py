@@ -0,0 +1,64 @@
+from datetime import datetime
+
+import cartopy.crs as ccrs
+import numpy as np
+import pandas as pd
+import pytest
+
+import cartopy_maps
+
+
+def test_basemap_is_rendered_at_axes_size(monkeypatch):
+    requested = []
+
+    def fake_basemap(projection, dpi, width):
+        requested.append((dpi, width))
+        return np.zeros((2, 2, 4), dtype=np.uint8)
+
+    monkeypatch.setattr(cartopy_maps, 'get_basemap', fake_basemap)
+    df = pd.DataFrame({'time': pd.to_datetime(['2024-01-02'] * 3), 'magnitude': [5.0, 6.0, 7.0],
+                       'latitude': [0.0, 10.0, 20.0], 'longitude': [0.0, 10.0, 20.0]})
+    cartopy_maps.create_world_map(df, datetime(2024, 1, 1), datetime(2024, 2, 1), 4.0)
+
+    (dpi, width), = requested
+    assert dpi == cartopy_maps.MAP_DPI
+    # Осите заемат по-малко от половината от ширината на фигурата
+    assert 4.0 < width < cartopy_maps.MAP_FIGSIZE[0] / 2
+
+
+def test_aggregate_events_per_cell():
+    longitudes = [10.2, 10.8, 10.5, -179.9, 12.0, np.nan]
+    latitudes = [45.1, 45.9, 45.5, -89.5, 46.5, 0.0]
+    magnitudes = [4.0, 5.5, 3.0, 6.0, 2.0, 7.0]
+    lon_edges, lat_edges, grids = cartopy_maps.aggregate_events(longitudes, latitudes, magnitudes, cell_size=1.0)
+
+    assert len(lon_edges) == 361 and len(lat_edges) == 181
+    cell = (45 + 90, 10 + 180)
+    assert grids['count'][cell] == 3
+    assert grids['max_magnitude'][cell] == 5.5
+    assert grids['energy'][cell] == pytest.approx(sum(10 ** (1.5 * m + 4.8) for m in (4.0, 5.5, 3.0)))
+    assert grids['count'][0, 0] == 1 and grids['max_magnitude'][0, 0] == 6.0
+    assert grids['count'][46 + 90, 12 + 180] == 1
+    # Събитието без координати не се брои
+    assert grids['count'].sum() == 5
+    assert np.isnan(grids['max_magnitude'][0, 180])
+
+
+def test_density_grid_stays_inside_mercator():
+    lat_range = cartopy_maps.latitude_range(ccrs.Mercator())
+    _, lat_edges, grids = cartopy_maps.aggregate_events([0.0, 0.0], [89.0, -89.0], [5.0, 5.0], lat_range=lat_range)
+    assert -86 < lat_edges[0] and lat_edges[-1] < 86
+    # Полярните събития се отнасят към крайните редове
+    assert grids['count'][-1].sum() == 1 and grids['count'][0].sum() == 1
+
+
+@pytest.mark.parametrize('threshold, density', [(None, False), (10, False), (2, True)])
+def test_density_threshold(monkeypatch, threshold, density):
+    monkeypatch.setattr(cartopy_maps, 'get_basemap', lambda projection, dpi, width: np.zeros((2, 2, 4), np.uint8))
+    calls = []
+    draw_density = cartopy_maps.draw_density
+    monkeypatch.setattr(cartopy_maps, 'draw_density', lambda *args: calls.append(args) or draw_density(*args))
+    df = pd.DataFrame({'time': pd.to_datetime(['2024-01-02'] * 3), 'magnitude': [5.0, 6.0, 7.0],
+                       'latitude': [0.0, 10.0, 20.0], 'longitude': [0.0, 10.0, 20.0]})
+    cartopy_maps.create_world_map(df, datetime(2024, 1, 1), datetime(2024, 2, 1), 4.0, density_threshold=threshold)
+    assert bool(calls) == density
@@ -0,0 +1,120 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+import requests
+
+from cancellation import AnalysisCancelled
+from data_fetcher import create_session, fetch_earthquake_data, merge_features, stream_earthquake_data
+
+START = datetime(2024, 1, 1)
+END = START + timedelta(days=60)
+
+
+def expected_ids(catalog, min_magnitude=2.5, updated_after=None):
+    start = int((START - datetime(1970, 1, 1)).total_seconds() * 1000)
+    end = int((END - datetime(1970, 1, 1)).total_seconds() * 1000)
+    return {feature['id'] for feature in catalog['features']
+            if start <= feature['properties']['time'] <= end and feature['properties']['mag'] >= min_magnitude
+            and (updated_after is None or feature['properties']['updated'] > updated_after)}
+
+
+def test_single_window_under_limit(fdsn, catalog):
+    data = fetch_earthquake_data(START, END, 2.5, base_url=fdsn.base_url)
+    assert data['metadata']['windows'] == 1
+    assert {feature['id'] for feature in data['features']} == expected_ids(catalog)
+    assert fdsn.requests.count('query') == 1
+
+
+def test_splits_windows_over_limit(fdsn, catalog):
+    fdsn.limit = 200
+    data = fetch_earthquake_data(START, END, 2.5, base_url=fdsn.base_url, limit=200)
+    ids = [feature['id'] for feature in data['features']]
+    assert data['metadata']['windows'] > len(ids) // 200
+    assert len(ids) == len(set(ids))
+    assert set(ids) == expected_ids(catalog)
+    assert data['metadata']['count'] == len(ids)
+    # Събитията са подредени от най-новото към най-старото, както ги връща услугата
+    times = [feature['properties']['time'] for feature in data['features']]
+    assert times == sorted(times, reverse=True)
+
+
+def test_min_magnitude_is_passed_to_the_service(fdsn, catalog):
+    data = fetch_earthquake_data(START, END, 4.0, base_url=fdsn.base_url)
+    assert {feature['id'] for feature in data['features']} == expected_ids(catalog, min_magnitude=4.0)
+
+
+def test_updated_after(fdsn, catalog):
+    updated_after = datetime(2024, 2, 1)
+    data = fetch_earthquake_data(START, END, 2.5, base_url=fdsn.base_url, updated_after=updated_after)
+    milliseconds = int((updated_after - datetime(1970, 1, 1)).total_seconds() * 1000)
+    assert {feature['id'] for feature in data['features']} == expected_ids(catalog, updated_after=milliseconds)
+
+
+def test_retries_transient_errors(fdsn, catalog):
+    fdsn.limit = 1000
+    fdsn.failures = {'count': 2, 'query': 2}
+    session = create_session(retries=3, backoff_factor=0)
+    try:
+        data = fetch_earthquake_data(START, END, 2.5, base_url=fdsn.base_url, session=session, limit=1000)
+    finally:
+        session.close()
+    assert {feature['id'] for feature in data['features']} == expected_ids(catalog)
+    assert fdsn.failures == {'count': 0, 'query': 0}
+
+
+def test_gives_up_after_retries(fdsn):
+    fdsn.failures = {'count': 10}
+    session = create_session(retries=2, backoff_factor=0)
+    try:
+        with pytest.raises(requests.RequestException):
+            fetch_earthquake_data(START, END, 2.5, base_url=fdsn.base_url, session=session)
+    finally:
+        session.close()
+
+
+def test_cancelled_before_download(fdsn):
+    cancel_event = threading.Event()
+    cancel_event.set()
+    with pytest.raises(AnalysisCancelled):
+        fetch_earthquake_data(START, END, 2.5, base_url=fdsn.base_url, cancel_event=cancel_event)
+    assert 'query' not in fdsn.requests
+
+
+def test_merge_keeps_newest_version():
+    def feature(event_id, time, updated, mag):
+        return {'id': event_id, 'properties': {'time': time, 'updated': updated, 'mag': mag}}
+
+    merged = merge_features([
+        [feature('a', 1, 10, 4.0), feature('b', 2, 10, 5.0)],
+        [feature('a', 1, 20, 4.2), feature('b', 2, 5, 4.8), feature('c', 3, 1, 3.0)],
+    ])
+    assert [item['id'] for item in merged] == ['c', 'b', 'a']
+    assert merged[1]['properties']['mag'] == 5.0
+    assert merged[2]['properties']['mag'] == 4.2
+
+
+def test_stream_yields_each_event_once_newest_first(fdsn, catalog):
+    fdsn.limit = 200
+    stats = {}
+    features = list(stream_earthquake_data(START, END, 2.5, base_url=fdsn.base_url, limit=200, max_workers=2,
+                                           stats=stats))
+    ids = [feature['id'] for feature in features]
+    assert len(ids) == len(set(ids))
+    assert set(ids) == expected_ids(catalog)
+    times = [feature['properties']['time'] for feature in features]
+    assert times == sorted(times, reverse=True)
+    assert stats['windows'] > 1 and stats['bytes'] > 0
+
+
+def test_cancelled_while_streaming(fdsn):
+    # Прекратяване след първото събитие: следващите подпериоди не се изтеглят докрай
+    fdsn.limit = 200
+    cancel_event = threading.Event()
+    received = 0
+    with pytest.raises(AnalysisCancelled):
+        for _ in stream_earthquake_data(START, END, 2.5, base_url=fdsn.base_url, limit=200,
+                                        cancel_event=cancel_event):
+            received += 1
+            cancel_event.set()
+    assert received < 200
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_processor import COLUMNS, UNKNOWN_COUNTRY, process_data, process_stream
+from regions import assign_regions
+from utils import CONTINENTS
+
+
+def legacy_frame(features):
+    # Преобразуване събитие по събитие, както в първоначалния process_data
+    rows = []
+    for feature in features:
+        properties = feature['properties']
+        longitude, latitude, depth = feature['geometry']['coordinates'][:3]
+        place = properties.get('place')
+        countries, continents = assign_regions(np.array([latitude]), np.array([longitude]))
+        rows.append({
+            'magnitude': properties['mag'],
+            'place': place,
+            'time': pd.to_datetime(properties['time'], unit='ms'),
+            'depth': depth,
+            'latitude': latitude,
+            'longitude': longitude,
+            'country': countries[0] or (place.split(', ')[-1] if place else UNKNOWN_COUNTRY),
+            'nearest_city': place,
+            'continent': continents[0],
+        })
+    return pd.DataFrame(rows)
+
+
+@pytest.fixture(scope='module')
+def features(catalog):
+    features = catalog['features'][:300]
+    # Събитие без описание на мястото
+    unnamed = dict(features[0], id='unnamed', properties=dict(features[0]['properties'], place=None))
+    return features + [unnamed]
+
+
+def test_columnar_matches_per_feature(features):
+    df = process_data({'features': features})
+    expected = legacy_frame(features)
+
+    assert list(df.columns) == COLUMNS
+    for column in ['magnitude', 'depth', 'latitude', 'longitude']:
+        assert df[column].dtype == np.float64
+        assert np.array_equal(df[column].to_numpy(), expected[column].to_numpy(dtype=float))
+    assert df['time'].dtype == 'datetime64[ns]'
+    assert np.array_equal(df['time'].to_numpy(), expected['time'].to_numpy(dtype='datetime64[ns]'))
+
+    for column in ['place', 'country', 'nearest_city', 'continent']:
+        assert isinstance(df[column].dtype, pd.CategoricalDtype)
+        assert list(df[column].astype(object).where(df[column].notna(), None)) == list(expected[column])
+    assert list(df['continent'].cat.categories) == CONTINENTS
+
+
+def test_empty_catalog_has_all_columns():
+    assert list(process_data({'features': []}).columns) == COLUMNS
+
+
+def test_stream_matches_single_frame(catalog):
+    features = catalog['features'][:500]
+    df = process_data({'features': features})
+    streamed = process_stream(iter(features), chunk_size=64)
+
+    assert list(streamed.columns) == COLUMNS
+    assert (streamed.dtypes == df.dtypes).all()
+    for column in COLUMNS:
+        pd.testing.assert_series_equal(streamed[column].astype(object), df[column].astype(object))
+    # Категориите от отделните порции се обединяват
+    assert set(streamed['place'].cat.categories) == set(df['place'].cat.categories)
+    assert list(streamed['continent'].cat.categories) == CONTINENTS
+
+
+def test_empty_stream():
+    assert list(process_stream(iter([])).columns) == COLUMNS
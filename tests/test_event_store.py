@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+
+from event_store import EventStore, covered_segments, missing_ranges
+
+START = datetime(2024, 1, 1)
+
+
+def test_missing_ranges_without_coverage():
+    assert missing_ranges([], 0, 100) == [(0, 100)]
+
+
+def test_missing_ranges_between_spans():
+    spans = [(10, 30, 1), (50, 60, 2), (25, 40, 3)]
+    assert missing_ranges(spans, 0, 100) == [(0, 10), (40, 50), (60, 100)]
+
+
+def test_missing_ranges_fully_covered():
+    assert missing_ranges([(0, 50, 1), (50, 100, 1)], 10, 90) == []
+
+
+def test_covered_segments_keep_newest_fetch_time():
+    segments = covered_segments([(0, 60, 5), (40, 100, 9)], 0, 100)
+    assert segments == [(0, 40, 5), (40, 60, 9), (60, 100, 9)]
+
+
+def test_query_fetches_only_missing_periods(fdsn, tmp_path):
+    store = EventStore(str(tmp_path / 'events.sqlite'), base_url=fdsn.base_url, refresh_interval=timedelta(days=1))
+
+    first = store.query(START, START + timedelta(days=20), 2.5)
+    assert first['metadata']['gaps'] == 1
+    assert first['metadata']['fetched'] == len(first['features'])
+
+    # Вторият период се припокрива с първия - изтегля се само новата част
+    second = store.query(START + timedelta(days=10), START + timedelta(days=30), 2.5)
+    assert second['metadata']['gaps'] == 1
+    assert second['metadata']['fetched'] == len(fdsn.select({
+        'starttime': [(START + timedelta(days=20)).isoformat()],
+        'endtime': [(START + timedelta(days=30)).isoformat()],
+        'minmagnitude': ['2.5']}))
+
+    # Същият период без обновяване не изпраща заявки
+    requests = len(fdsn.requests)
+    third = store.query(START + timedelta(days=5), START + timedelta(days=25), 2.5)
+    assert third['metadata']['gaps'] == 0
+    assert len(fdsn.requests) == requests
+
+    expected = fdsn.select({'starttime': [(START + timedelta(days=5)).isoformat()],
+                            'endtime': [(START + timedelta(days=25)).isoformat()],
+                            'minmagnitude': ['2.5']})
+    assert sorted(feature['id'] for feature in third['features']) == sorted(feature['id'] for feature in expected)
+
+
+def test_higher_magnitude_is_covered_by_lower(fdsn, tmp_path):
+    store = EventStore(str(tmp_path / 'events.sqlite'), base_url=fdsn.base_url, refresh_interval=timedelta(days=1))
+    store.query(START, START + timedelta(days=10), 2.5)
+    data = store.query(START, START + timedelta(days=10), 4.0)
+    assert data['metadata']['gaps'] == 0
+    assert all(feature['properties']['mag'] >= 4.0 for feature in data['features'])
+
+
+def test_refresh_after_interval(fdsn, tmp_path):
+    store = EventStore(str(tmp_path / 'events.sqlite'), base_url=fdsn.base_url, refresh_interval=timedelta(0))
+    store.query(START, START + timedelta(days=10), 2.5)
+    data = store.query(START, START + timedelta(days=10), 2.5)
+    assert data['metadata']['gaps'] == 0
+    assert fdsn.requests.count('count') == 2
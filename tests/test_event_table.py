@@ -0,0 +1,49 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from analyzer import analyze_aftershocks, analyze_seismic_activity_change
+from data_processor import process_data
+from event_table import EVENT_DTYPE, from_frame, load_table, save_table
+
+
+@pytest.fixture(scope='module')
+def frame(catalog):
+    return process_data(catalog)
+
+
+def test_record_size():
+    assert EVENT_DTYPE.itemsize == 31
+
+
+def test_round_trip_through_memmap(frame, tmp_path):
+    save_table(from_frame(frame), str(tmp_path / 'table'))
+    table = load_table(str(tmp_path / 'table'))
+    assert isinstance(table.records, np.memmap)
+    assert len(table) == len(frame)
+
+    restored = table.to_frame()
+    assert np.array_equal(restored['time'].to_numpy(), frame['time'].to_numpy().astype('datetime64[ms]')
+                          .astype('datetime64[ns]'))
+    assert np.allclose(restored['magnitude'], frame['magnitude'], atol=0.005)
+    assert np.allclose(restored['latitude'], frame['latitude'], atol=1e-4)
+    assert np.allclose(restored['depth'], frame['depth'], atol=1e-3)
+    assert list(restored['place'].astype(object)) == list(frame['place'].astype(object))
+    assert list(restored['country'].astype(object)) == list(frame['country'].astype(object))
+    assert list(restored['continent'].astype(object)) == list(frame['continent'].astype(object))
+
+
+def test_select_matches_frame_filter(frame):
+    start, end = datetime(2024, 1, 10), datetime(2024, 2, 10)
+    selected = from_frame(frame).select(start, end, 3.5)
+    mask = (frame['time'] >= start) & (frame['time'] <= end) & (frame['magnitude'] >= 3.5)
+    assert len(selected) == int(mask.sum())
+
+
+def test_analysis_accepts_table(frame):
+    table = from_frame(frame)
+    start, end = datetime(2024, 1, 1), datetime(2024, 3, 1)
+    assert analyze_aftershocks(table) == analyze_aftershocks(frame)
+    assert (analyze_seismic_activity_change(table, start, end, 3.0)
+            == analyze_seismic_activity_change(frame, start, end, 3.0))
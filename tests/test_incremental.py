@@ -0,0 +1,105 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from analyzer import analyze_seismic_activity_change
+from data_processor import process_data
+from declustering import decluster
+from incremental import IncrementalAnalysis
+from live_feed import LiveCatalog
+from utils import pearson_correlation
+
+START = datetime(2024, 1, 1)
+END = datetime(2024, 3, 1)
+
+
+@pytest.fixture
+def frame(catalog):
+    df = process_data(catalog)
+    df.index = [feature['id'] for feature in catalog['features']]
+    # Магнитудите са с точност 0.01; малко отместване прави реда при декластеризацията еднозначен
+    df['magnitude'] += np.random.default_rng(0).uniform(0, 1e-5, len(df))
+    return df
+
+
+def batch_clusters(df):
+    order = np.argsort(-df['magnitude'].to_numpy(), kind='stable')
+    main_of = decluster(df['time'].to_numpy(dtype='datetime64[ns]')[order], df['latitude'].to_numpy()[order],
+                        df['longitude'].to_numpy()[order], df['magnitude'].to_numpy()[order])
+    is_main = main_of == np.arange(len(main_of))
+    # Идентификаторите в реда на декластеризацията и идентификаторът на главното земетресение на всяко събитие
+    ids = df.index[order]
+    return int(is_main.sum()), int((~is_main).sum()), ids, ids[main_of]
+
+
+def assert_matches_batch(analysis, df):
+    assert len(analysis.events) == len(df)
+    assert analysis.mean_depth == pytest.approx(df['depth'].mean(), rel=1e-9)
+    assert analysis.mean_magnitude == pytest.approx(df['magnitude'].mean(), rel=1e-9)
+    assert analysis.correlation == pytest.approx(pearson_correlation(df['depth'], df['magnitude']), rel=1e-6)
+
+    analysis.top_earthquakes()
+    assert sorted(item[0] for item in analysis._top) == sorted(df['magnitude'].nlargest(3))
+
+    counts = df['country'].value_counts()
+    assert analysis.most_affected_region()[1] == counts.iloc[0]
+    assert analysis.activity_change(START, END, 3.0) == analyze_seismic_activity_change(df, START, END, 3.0)
+
+    main_shocks, aftershocks, _, _ = batch_clusters(df)
+    assert (analysis.main_shocks, analysis.aftershocks) == (main_shocks, aftershocks)
+
+
+def test_appends_match_batch(frame):
+    # Порции по низходящ магнитуд - декластеризацията с добавяне съвпада с тази на целия каталог
+    ordered = frame.sort_values('magnitude', ascending=False)
+    analysis = IncrementalAnalysis()
+    for batch in np.array_split(np.arange(len(ordered)), 5):
+        analysis.update(ordered.iloc[batch])
+    assert_matches_batch(analysis, frame)
+
+
+def test_revisions_and_removals_match_batch(frame):
+    analysis = IncrementalAnalysis()
+    ordered = frame.sort_values('magnitude', ascending=False)
+    for batch in np.array_split(np.arange(len(ordered)), 3):
+        analysis.update(ordered.iloc[batch])
+    _, _, ids, main_ids = batch_clusters(frame)
+    aftershocks = ids[main_ids != ids]
+
+    # Обновени афтършокове (по-малък магнитуд, друга дълбочина) и премахнати афтършокове
+    revised = frame.loc[aftershocks[:50]].copy()
+    revised['magnitude'] -= 0.05
+    revised['depth'] += 7.5
+    analysis.update(revised)
+    analysis.remove(aftershocks[50:80])
+    expected = frame.drop(aftershocks[50:80])
+    expected.loc[revised.index] = revised
+    assert_matches_batch(analysis, expected)
+
+    # Обновено най-силното земетресение и премахнато главно земетресение - състоянието се изчислява наново
+    strongest = expected['magnitude'].idxmax()
+    revised = expected.loc[[strongest]].copy()
+    revised['magnitude'] -= 2.0
+    analysis.update(revised)
+    removed = ids[(main_ids == ids) & (ids != strongest)][0]
+    analysis.remove([removed])
+    expected.loc[revised.index] = revised
+    expected = expected.drop(removed)
+    assert_matches_batch(analysis, expected)
+
+
+def test_remove_everything(frame):
+    analysis = IncrementalAnalysis().update(frame.iloc[:100])
+    analysis.remove(frame.index[:100])
+    assert analysis.count == 0 and not analysis.buckets and not analysis.country_counts
+    assert analysis.main_shocks == 0 and analysis.top_earthquakes() == ''
+
+
+def test_live_catalog_keeps_analysis_in_sync(frame):
+    catalog = LiveCatalog()
+    ordered = frame.sort_values('time')
+    for batch in np.array_split(np.arange(len(ordered)), 10):
+        catalog.apply(ordered.iloc[batch])
+    assert_matches_batch(catalog.analysis, catalog.df)
+    assert catalog.df['time'].min() >= frame['time'].max() - catalog.max_age
@@ -0,0 +1,64 @@
+import logging
+import time
+
+import pytest
+
+from instrumentation import Trace, current_rss, log_value
+from rendering import render_charts
+
+
+def test_values_with_spaces_are_quoted():
+    assert log_value('Северна Америка') == '"Северна Америка"'
+    assert log_value('Европа') == 'Европа'
+    assert log_value('') == '""'
+
+
+def test_log_lines_stay_key_value(caplog):
+    trace = Trace('2024_M5.0_Северна Америка', capture=None)
+    with caplog.at_level(logging.INFO, logger='earthquake_analyzer'):
+        trace.start('fetching', events=3)
+        trace.stop()
+        trace.record('world_map', 0.5)
+    for message in caplog.messages:
+        assert message.startswith('trace="2024_M5.0_Северна Америка" stage=')
+    assert [record['stage'] for record in trace.stages] == ['fetching', 'world_map']
+
+
+def test_render_charts_reports_timings():
+    timings = {}
+    images = render_charts({'sleep': (time.sleep, (0.05,)), 'sum': (sum, ([1, 2],))}, parallel=False,
+                           timings=timings)
+    assert images == {'sleep': None, 'sum': 3}
+    assert timings['sleep'] >= 0.05
+    assert set(timings) == {'sleep', 'sum'}
+
+
+@pytest.mark.skipif(current_rss() is None, reason='текущата памет не е достъпна')
+def test_stage_memory_is_a_change_not_the_lifetime_peak():
+    trace = Trace('памет', capture=None)
+    trace.start('allocate')
+    block = bytearray(64 * 1024 * 1024)
+    block[::4096] = b'x' * len(block[::4096])
+    trace.start('release')
+    del block
+    trace.start('idle')
+    trace.finish()
+    allocate, release, idle = trace.stages
+    assert allocate['rss_delta'] > 48 * 1024 * 1024
+    assert release['rss_delta'] < 0
+    assert abs(idle['rss_delta']) < 16 * 1024 * 1024
+    assert trace.peak_rss >= allocate['rss_delta']
+    assert 'памет +' in trace.summary().splitlines()[0]
+
+
+def test_traced_peak_is_reset_for_each_stage():
+    trace = Trace('tracemalloc', capture='tracemalloc')
+    trace.start('allocate')
+    block = bytearray(16 * 1024 * 1024)
+    del block
+    trace.start('small')
+    trace.finish()
+    allocate, small = trace.stages
+    assert allocate['peak_traced'] >= 16 * 1024 * 1024
+    assert small['peak_traced'] < 1024 * 1024
+    assert 'пик на етапа' in trace.summary()
@@ -0,0 +1,50 @@
+import io
+import json
+
+import pytest
+
+from json_stream import iter_features, read_features
+
+DOCUMENT = {
+    'type': 'FeatureCollection',
+    'metadata': {'generated': 1704067200000, 'title': 'тест "кавички" и {скоби}', 'count': 3},
+    'features': [
+        {'id': 'a', 'properties': {'mag': 4.25, 'place': '10 km N of Sofia, Bulgaria', 'time': 1704067200123},
+         'geometry': {'type': 'Point', 'coordinates': [23.32, 42.7, 10.0]}},
+        {'id': 'b', 'properties': {'mag': -0.5, 'place': None, 'time': 1704067200456, 'tsunami': 0},
+         'geometry': {'type': 'Point', 'coordinates': [-155.123456789, 19.4, 1e-3]}},
+        {'id': 'c', 'properties': {'mag': 7, 'place': 'Пуерто Рико \\u00e9', 'time': 1704067200789},
+         'geometry': {'type': 'Point', 'coordinates': [-66.1, 18.2, 120]}},
+    ],
+    'bbox': [-155.1, 18.2, 1e-3, 23.3, 42.7, 120],
+}
+
+
+@pytest.mark.parametrize('indent', [None, 2])
+def test_every_chunk_boundary(indent):
+    text = json.dumps(DOCUMENT, ensure_ascii=False, indent=indent)
+    # Всяко разделяне на текста - числата, низовете и ключовете попадат на границата на четене
+    for read_size in list(range(1, 40)) + [97, 256, len(text)]:
+        assert list(iter_features(io.StringIO(text), read_size=read_size)) == DOCUMENT['features'], read_size
+
+
+def test_features_before_metadata():
+    text = json.dumps({'features': DOCUMENT['features'], 'metadata': DOCUMENT['metadata']})
+    assert list(iter_features(io.StringIO(text), read_size=5)) == DOCUMENT['features']
+
+
+@pytest.mark.parametrize('text', ['{}', '{"features": []}', '{"type": "FeatureCollection", "features": [ ]}'])
+def test_no_features(text):
+    assert list(iter_features(io.StringIO(text), read_size=3)) == []
+
+
+def test_truncated_document():
+    text = json.dumps(DOCUMENT)[:-40]
+    with pytest.raises(ValueError):
+        list(iter_features(io.StringIO(text), read_size=16))
+
+
+def test_read_features_from_file(tmp_path):
+    path = tmp_path / 'catalog.geojson'
+    path.write_text(json.dumps(DOCUMENT, ensure_ascii=False), encoding='utf-8')
+    assert list(read_features(str(path), read_size=7)) == DOCUMENT['features']
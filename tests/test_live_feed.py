@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from live_feed import FeedPoller, LiveCatalog, features_to_frame
+
+
+class FakeResponse:
+    status_code = 200
+    headers = {}
+    content = b''
+
+    def __init__(self, features):
+        self.features = features
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {'metadata': {'generated': 0}, 'features': self.features}
+
+
+class FakeSession:
+    def __init__(self):
+        self.features = []
+
+    def get(self, url, headers=None, timeout=None):
+        return FakeResponse(self.features)
+
+    def close(self):
+        pass
+
+
+def feature(event_id, magnitude, updated, hours=0):
+    time = int((datetime(2024, 1, 1) + timedelta(hours=hours)).timestamp() * 1000)
+    return {'id': event_id, 'type': 'Feature',
+            'properties': {'mag': magnitude, 'time': time, 'updated': updated, 'place': 'тест'},
+            'geometry': {'type': 'Point', 'coordinates': [10.0, 45.0, 5.0]}}
+
+
+def test_revised_above_threshold_is_new():
+    session = FakeSession()
+    poller = FeedPoller('http://feed', min_magnitude=3.0, session=session)
+    session.features = [feature('a', 2.5, 1), feature('b', 3.5, 1)]
+    new, updated = poller.poll()
+    assert [f['id'] for f in new] == ['b'] and updated == []
+
+    session.features = [feature('a', 3.2, 2), feature('b', 3.6, 2)]
+    new, updated = poller.poll()
+    assert [f['id'] for f in new] == ['a']
+    assert [f['id'] for f in updated] == ['b']
+
+
+def test_known_events_are_pruned():
+    session = FakeSession()
+    poller = FeedPoller('http://feed', session=session)
+    session.features = [feature('a', 3.0, 1), feature('b', 3.0, 1)]
+    poller.poll()
+    session.features = [feature('b', 3.0, 1), feature('c', 3.0, 1)]
+    new, updated = poller.poll()
+    assert [f['id'] for f in new] == ['c'] and updated == []
+    assert set(poller.known) == {'b', 'c'}
+    assert poller.listed == {'b', 'c'}
+
+
+def test_catalog_drops_old_events_by_default():
+    catalog = LiveCatalog()
+    catalog.apply(features_to_frame([feature('a', 3.0, 1, hours=0), feature('b', 3.0, 1, hours=30)]))
+    assert list(catalog.df.index) == ['b']
+    assert catalog.df['time'].min() >= pd.Timestamp(2024, 1, 2)
@@ -0,0 +1,57 @@
+import warnings
+
+import numpy as np
+import pytest
+
+from data_processor import process_data
+from declustering import decluster, fixed_window, gardner_knopoff_window
+from region_statistics import group_keys, grouped_statistics
+from utils import pearson_correlation
+
+
+@pytest.fixture(scope='module')
+def frame(catalog):
+    return process_data(catalog)
+
+
+def per_group_reference(df, keys, window):
+    # Декластеризация на всяка група поотделно
+    counts = {}
+    for group, positions in df.groupby(keys, observed=True).indices.items():
+        subset = df.iloc[positions].sort_values('magnitude', ascending=False, kind='stable')
+        main_of = decluster(subset['time'].to_numpy(dtype='datetime64[ns]'), subset['latitude'].to_numpy(dtype=float),
+                            subset['longitude'].to_numpy(dtype=float), subset['magnitude'].to_numpy(dtype=float),
+                            window=window)
+        main_shocks = int(np.count_nonzero(main_of == np.arange(len(main_of))))
+        counts[group] = (main_shocks, len(main_of) - main_shocks)
+    return counts
+
+
+@pytest.mark.parametrize('by', ['continent', 'country', 'grid'])
+@pytest.mark.parametrize('window', [fixed_window, gardner_knopoff_window])
+def test_matches_per_group_analysis(frame, by, window):
+    report = grouped_statistics(frame, by=by, window=window)
+    keys = group_keys(frame, by)
+    expected = per_group_reference(frame, keys, window)
+
+    assert set(report.index) == set(expected)
+    for group, row in report.iterrows():
+        assert (row['main_shocks'], row['aftershocks']) == expected[group]
+        subset = frame[np.asarray(keys == group)]
+        assert row['count'] == len(subset)
+        assert row['mean_magnitude'] == pytest.approx(subset['magnitude'].mean())
+        if len(subset) > 2:
+            assert row['depth_magnitude_correlation'] == pytest.approx(
+                pearson_correlation(subset['depth'], subset['magnitude']), abs=1e-9)
+
+
+def test_grid_skips_missing_coordinates(frame):
+    df = frame.copy()
+    df.loc[df.index[:10], 'latitude'] = np.nan
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', RuntimeWarning)
+        keys = group_keys(df, 'grid')
+    assert keys[:10].isna().all()
+    assert keys[10:].notna().all()
+    report = grouped_statistics(df, by='grid')
+    assert report['count'].sum() == len(df) - 10
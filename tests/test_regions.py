@@ -0,0 +1,61 @@
+import logging
+
+import pytest
+import shapely
+
+import regions
+from regions import build_region_index
+
+
+def test_overlapping_polygons_take_first_match():
+    geometries = [shapely.box(0, 0, 10, 10), shapely.box(5, 0, 15, 10), shapely.box(20, 0, 30, 10)]
+    index = build_region_index([(geometry, name, 'Europe') for geometry, name in zip(geometries, 'ABC')])
+    countries, continents = index.lookup([5, 5, 5, 5, 5], [2, 7, 12, 25, 60])
+    assert list(countries) == ['A', 'A', 'B', 'C', None]
+    assert list(continents) == ['Европа'] * 5
+
+
+def test_failed_load_is_retried(monkeypatch, caplog):
+    monkeypatch.setattr(regions, '_indexes', {})
+    monkeypatch.setattr(regions, '_failed_at', {})
+    records = [(shapely.box(0, 0, 10, 10), 'A', 'Europe')]
+
+    def offline(resolution, download=True):
+        raise OSError("няма връзка")
+
+    monkeypatch.setattr(regions, 'natural_earth_records', offline)
+    with caplog.at_level(logging.WARNING, logger='earthquake_analyzer'):
+        assert regions.load_region_index() is None
+    assert 'няма връзка' in caplog.text
+
+    # Неуспехът не се помни завинаги - след RETRY_INTERVAL границите се зареждат отново
+    monkeypatch.setattr(regions, 'natural_earth_records', lambda resolution, download=True: iter(records))
+    assert regions.load_region_index() is None
+    monkeypatch.setattr(regions, 'RETRY_INTERVAL', 0)
+    index = regions.load_region_index()
+    assert index is not None and regions.load_region_index() is index
+
+
+@pytest.fixture(scope='module')
+def natural_earth_index():
+    try:
+        regions.natural_earth_path(download=False)
+    except OSError:
+        pytest.skip("границите от Natural Earth не са изтеглени")
+    return build_region_index(regions.natural_earth_records(download=False))
+
+
+@pytest.mark.parametrize('latitude, longitude, country, continent', [
+    (42.70, 23.32, 'Bulgaria', 'Европа'),
+    (55.75, 37.62, 'Russia', 'Европа'),
+    (55.03, 82.92, 'Russia', 'Азия'),
+    (65.00, -172.00, 'Russia', 'Азия'),
+    (61.22, -149.90, 'United States of America', 'Северна Америка'),
+    (35.68, 139.69, 'Japan', 'Азия'),
+    (-33.45, -70.67, 'Chile', 'Южна Америка'),
+    (-1.29, 36.82, 'Kenya', 'Африка'),
+    (-33.87, 151.21, 'Australia', 'Океания'),
+])
+def test_real_shapes(natural_earth_index, latitude, longitude, country, continent):
+    countries, continents = natural_earth_index.lookup([latitude], [longitude])
+    assert (countries[0], continents[0]) == (country, continent)
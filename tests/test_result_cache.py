@@ -0,0 +1,25 @@
+import result_cache
+from result_cache import ResultCache, result_key
+
+
+def test_key_depends_on_result_format(monkeypatch):
+    key = result_key('abc', 1, 2.5)
+    monkeypatch.setattr(result_cache, 'RESULT_FORMAT', result_cache.RESULT_FORMAT + 1)
+    assert result_key('abc', 1, 2.5) != key
+
+
+def test_invalid_value_is_a_miss(tmp_path):
+    ResultCache(disk_dir=str(tmp_path)).put('key', ('стар', 'резултат'))
+
+    # Нов процес: стойността идва от диска
+    cache = ResultCache(disk_dir=str(tmp_path))
+    assert cache.get('key', valid=lambda value: len(value) == 9) is None
+    assert cache.misses == 1
+    assert cache.get('key') == ('стар', 'резултат')
+
+
+def test_memory_value_checked_too():
+    cache = ResultCache()
+    cache.put('key', {'world_map': b''})
+    assert cache.get('key', valid=lambda value: 'seismicity_rates' in value) is None
+    assert cache.get('key', valid=lambda value: 'world_map' in value) == {'world_map': b''}
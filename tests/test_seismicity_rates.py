@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_processor import process_data
+from region_statistics import group_keys
+from seismicity_rates import count_between, rate_engine, seismic_moment
+
+START = datetime(2024, 1, 1)
+END = datetime(2024, 3, 1)
+
+
+@pytest.fixture(scope='module')
+def frame(catalog):
+    return process_data(catalog)
+
+
+@pytest.mark.parametrize('by', [None, 'continent', 'grid'])
+def test_windows_match_brute_force(frame, by):
+    window, step = timedelta(days=10), timedelta(days=3)
+    rates = rate_engine(frame, START, END, window=window, step=step, by=by, min_magnitude=2.5)
+
+    keys = np.full(len(frame), 'Всички', dtype=object) if by is None else group_keys(frame, by).astype(object)
+    times = frame['time'].to_numpy()
+    for r, region in enumerate(rates['regions']):
+        in_region = np.asarray(keys == region)
+        for w, window_end in enumerate(rates['time']):
+            selected = in_region & (times > window_end - np.timedelta64(window)) & (times <= window_end)
+            assert rates['count'][r, w] == selected.sum()
+            assert rates['moment'][r, w] == pytest.approx(seismic_moment(frame['magnitude'][selected]).sum(),
+                                                          rel=1e-9)
+
+
+def test_windows_stay_inside_period(frame):
+    rates = rate_engine(frame, START, END, window=timedelta(days=7), step=timedelta(days=7))
+    assert rates['time'][-1] <= np.datetime64(END)
+    assert rates['count'].shape == (1, len(rates['time']))
+
+
+def test_b_value_of_gutenberg_richter_catalog(frame):
+    # Синтетичният каталог е генериран с b = 1
+    rates = rate_engine(frame, START, END, window=END - START, step=END - START, completeness=2.5)
+    assert rates['b_value'][0, 0] == pytest.approx(1.0, abs=0.1)
+
+
+def test_anomaly_for_burst():
+    rng = np.random.default_rng(0)
+    background = START + pd.to_timedelta(rng.uniform(0, 60, 600), unit='D')
+    burst = datetime(2024, 2, 15) + pd.to_timedelta(rng.uniform(0, 1, 200), unit='D')
+    times = pd.DatetimeIndex(background.append(burst))
+    df = pd.DataFrame({'time': times, 'magnitude': 3.0, 'latitude': 0.0, 'longitude': 0.0})
+    rates = rate_engine(df, START, END, window=timedelta(days=2), step=timedelta(days=1))
+    flagged = rates['time'][rates['anomaly'][0]]
+    assert len(flagged) > 0
+    assert all(np.datetime64('2024-02-15') <= t <= np.datetime64('2024-02-18') for t in flagged)
+
+
+def test_count_between_includes_last_bound():
+    times = np.array(['2024-01-01', '2024-01-02', '2024-01-03'], dtype='datetime64[ns]')
+    bounds = np.array(['2024-01-01', '2024-01-02', '2024-01-03'], dtype='datetime64[ns]')
+    assert list(count_between(times, bounds)) == [1, 2]
@@ -37,44 +37,57 @@ def depth_magnitude_correlation(correlation):
                 "С увеличаване на дълбочината, магнитудът значително намалява.")
 
 
-def assess_seismic_hazard(df, region):
-    region_data = df[df['country'] == region]
-    mean_magnitude = region_data['magnitude'].mean()
-
+def seismic_risk_level(mean_magnitude):
     if mean_magnitude < 4.0:
-        risk_level = "Нисък"
-        recommendations = [
-            "Прилагане на стандартни строителни практики",
-            "Спазване на основните изисквания на сеизмичните кодове",
-        ]
+        return "Нисък"
     elif 4.0 <= mean_magnitude < 5.0:
-        risk_level = "Умерен"
-        recommendations = [
-            "Проектиране на сгради с повишена дуктилност",
-            "Укрепване на съществуващи стари сгради",
-            "Специално внимание към детайлирането на конструктивните връзки"
-        ]
+        return "Умерен"
     elif 5.0 <= mean_magnitude < 7.0:
-        risk_level = "Висок"
-        recommendations = [
-            "Използване на сеизмично изолиране за важни и високи сгради",
-            "Строго прилагане на съвременни антисеизмични строителни техники",
-            "Регулярни инспекции и retrofit на съществуващи конструкции",
-            "Ограничаване на височината на сградите в определени зони",
-            "Задължителни обучения за аварийно реагиране за всички жители",
-            "Създаване на системи за ранно предупреждение"
-        ]
+        return "Висок"
     else:
-        risk_level = "Много висок"
-        recommendations = [
-            "Задължително използване на авангардни технологии за сеизмична защита",
-            "Строги ограничения върху земеползването и гъстотата на застрояване",
-            "Непрекъснат мониторинг на сеизмичната активност",
-            "Периодично преразглеждане и обновяване на строителните норми",
-            "Масивни кампании за обществена осведоменост и готовност",
-            "Разработване на подробни планове за управление на бедствия",
-            "Инвестиции в изследвания за подобряване на сеизмичната устойчивост"
-        ]
+        return "Много висок"
+
+
+RISK_RECOMMENDATIONS = {
+    "Нисък": [
+        "Прилагане на стандартни строителни практики",
+        "Спазване на основните изисквания на сеизмичните кодове",
+    ],
+    "Умерен": [
+        "Проектиране на сгради с повишена дуктилност",
+        "Укрепване на съществуващи стари сгради",
+        "Специално внимание към детайлирането на конструктивните връзки"
+    ],
+    "Висок": [
+        "Използване на сеизмично изолиране за важни и високи сгради",
+        "Строго прилагане на съвременни антисеизмични строителни техники",
+        "Регулярни инспекции и retrofit на съществуващи конструкции",
+        "Ограничаване на височината на сградите в определени зони",
+        "Задължителни обучения за аварийно реагиране за всички жители",
+        "Създаване на системи за ранно предупреждение"
+    ],
+    "Много висок": [
+        "Задължително използване на авангардни технологии за сеизмична защита",
+        "Строги ограничения върху земеползването и гъстотата на застрояване",
+        "Непрекъснат мониторинг на сеизмичната активност",
+        "Периодично преразглеждане и обновяване на строителните норми",
+        "Масивни кампании за обществена осведоменост и готовност",
+        "Разработване на подробни планове за управление на бедствия",
+        "Инвестиции в изследвания за подобряване на сеизмичната устойчивост"
+    ],
+}
+
+
+def assess_seismic_hazard(df, region):
+    region_data = df[df['country'] == region]
+    mean_magnitude = region_data['magnitude'].mean()
+
+    return format_seismic_hazard(region, mean_magnitude)
+
+
+def format_seismic_hazard(region, mean_magnitude):
+    risk_level = seismic_risk_level(mean_magnitude)
+    recommendations = RISK_RECOMMENDATIONS[risk_level]
 
     assessment = (f"Ниво на риск за {region}: {risk_level}\n"
                   f"Препоръки:\n")
@@ -100,4 +113,24 @@ def get_continent(lat, lon):
     elif lat > 0:
         return 'Северна Америка'
     else:
-        return 'Южна Америка'
\ No newline at end of file
+        return 'Южна Америка'
+
+
+CONTINENTS = ['Африка', 'Антарктика', 'Азия', 'Европа', 'Северна Америка', 'Океания', 'Южна Америка']
+
+
+def get_continents(latitudes, longitudes):
+    # Векторизиран вариант на get_continent за цели масиви от координати
+    lat = np.asarray(latitudes, dtype=float)
+    lon = np.asarray(longitudes, dtype=float)
+    europe_africa = (-20 <= lon) & (lon <= 60)
+    conditions = [
+        (lat > 66.5) | (lat < -66.5),
+        europe_africa & (lat > 30),
+        europe_africa,
+        (60 < lon) & (lon <= 150),
+        (lon > 150) | (lon <= -140),
+        lat > 0
+    ]
+    choices = ['Антарктика', 'Европа', 'Африка', 'Азия', 'Океания', 'Северна Америка']
+    return np.select(conditions, choices, default='Южна Америка')
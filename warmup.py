@@ -0,0 +1,39 @@
+import importlib
+import threading
+import time
+
+# Модулите с научния и картографския стек, които се зареждат при първа употреба
+HEAVY_MODULES = [
+    'numpy',
+    'pandas',
+    'shapely',
+    'matplotlib.figure',
+    'matplotlib.backends.backend_agg',
+    'cartopy.crs',
+    'data_processor',
+    'regions',
+    'analyzer',
+    'cartopy_maps',
+    'live_feed',
+]
+
+
+def prewarm(modules=HEAVY_MODULES):
+    # Зареждане на модулите предварително; връща времето за всеки модул в секунди
+    timings = {}
+    for name in modules:
+        started = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            continue
+        timings[name] = time.perf_counter() - started
+    return timings
+
+
+def start_prewarm(modules=HEAVY_MODULES):
+    # Зареждане във фонова нишка, докато потребителят въвежда параметрите.
+    # Ако анализът започне по-рано, импортът в него изчаква вече започнатото зареждане.
+    thread = threading.Thread(target=prewarm, args=(modules,), daemon=True)
+    thread.start()
+    return thread